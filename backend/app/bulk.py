@@ -0,0 +1,101 @@
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import update, delete, bindparam, func, Boolean
+from .models import Subscription, Reminder
+from .notify_schedule import (
+    load_global_notify_settings, subscription_notify_rule, next_subscription_fire, next_reminder_fire
+)
+
+# Columns the precomputed next_notify_at is derived from; patches touching
+# none of them leave the schedule alone
+SUBSCRIPTION_SCHEDULE_COLUMNS = ("next_date", "notify_mode", "cust_days", "cust_time", "last_sent", "is_disabled")
+REMINDER_SCHEDULE_COLUMNS = ("target_date", "target_time", "is_sent", "is_disabled")
+# Date column moved by a patch's shift_days
+SHIFTED_COLUMNS = {Subscription: "next_date", Reminder: "target_date"}
+
+
+def selection(model, ids: Optional[List[int]], conditions: list) -> list:
+    """WHERE clauses for a bulk request naming ids, a filter, or both"""
+    if ids is None and not conditions:
+        raise HTTPException(status_code=400, detail="Give ids or a filter with at least one condition")
+    clauses = list(conditions)
+    if ids is not None:
+        clauses.append(model.id.in_(ids))
+    return clauses
+
+
+def bulk_result(results: list) -> dict:
+    return {"results": results, "counts": dict(Counter(result["status"] for result in results))}
+
+
+def id_outcomes(requested: Optional[List[int]], affected: List[int], status: str) -> list:
+    """One result per requested id, or per affected id when rows were picked by filter"""
+    done = set(affected)
+    if requested is None:
+        return [{"id": item_id, "status": status} for item_id in sorted(done)]
+    return [{"id": item_id, "status": status if item_id in done else "not_found"} for item_id in requested]
+
+
+def patch_values(model, changes: dict, now: datetime) -> dict:
+    """SET clause for a patch; shift_days and is_disabled become SQL expressions"""
+    table = model.__table__
+    values = dict(changes)
+    shift = values.pop("shift_days", None)
+    shifted = SHIFTED_COLUMNS[model]
+    if shift is not None:
+        if shifted in values:
+            raise HTTPException(status_code=400, detail=f"Give either {shifted} or shift_days, not both")
+        values[shifted] = func.date(table.c[shifted], f"{shift:+d} days")
+    for key, value in values.items():
+        column = table.c[key]
+        if value is None and (not column.nullable or isinstance(column.type, Boolean)):
+            raise HTTPException(status_code=400, detail=f"{key} cannot be null")
+    if "is_disabled" in values and "disabled_at" in table.c:
+        # Same bookkeeping as retention.track_disabled, row by row in SQL
+        values["disabled_at"] = func.coalesce(table.c.disabled_at, now) if values["is_disabled"] else None
+    if not values:
+        raise HTTPException(status_code=400, detail="No changes given")
+    return values
+
+
+def patch_rows(db, model, clauses: list, changes: dict, now: datetime) -> List[int]:
+    """Apply the same changes to every selected row with one UPDATE; returns the ids it matched"""
+    table = model.__table__
+    values = patch_values(model, changes, now)
+    schedule_columns = SUBSCRIPTION_SCHEDULE_COLUMNS if model is Subscription else REMINDER_SCHEDULE_COLUMNS
+    if not any(name in values for name in schedule_columns):
+        return db.execute(update(table).where(*clauses).values(values).returning(table.c.id)).scalars().all()
+    # RETURNING hands back the post-update values the new schedule is computed from
+    rows = db.execute(
+        update(table).where(*clauses).values(values)
+        .returning(table.c.id, *(table.c[name] for name in schedule_columns))
+    ).all()
+    refresh_schedules(db, model, rows, now)
+    return [row.id for row in rows]
+
+
+def delete_rows(db, model, clauses: list) -> List[int]:
+    table = model.__table__
+    return db.execute(delete(table).where(*clauses).returning(table.c.id)).scalars().all()
+
+
+def refresh_schedules(db, model, rows, now: datetime):
+    """Recompute next_notify_at for (id, *schedule columns) rows in one executemany UPDATE"""
+    if model is Subscription:
+        global_days, global_time = load_global_notify_settings(db)
+        params = []
+        for row in rows:
+            next_notify_at, next_notify_offset = None, None
+            if not row.is_disabled:
+                notify_days, notify_time = subscription_notify_rule(row, global_days, global_time)
+                next_notify_at, next_notify_offset = next_subscription_fire(
+                    row.next_date, notify_days, notify_time, row.last_sent, now
+                )
+            params.append({"_id": row.id, "next_notify_at": next_notify_at, "next_notify_offset": next_notify_offset})
+    else:
+        params = [{"_id": row.id, "next_notify_at": next_reminder_fire(row, now)} for row in rows]
+    if params:
+        table = model.__table__
+        db.execute(update(table).where(table.c.id == bindparam("_id")), params)
@@ -0,0 +1,86 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import update
+from .database import SessionLocal
+from .models import ChannelState
+from .resilience import channel_guards
+from .transport import transport
+
+# How often the scheduler leader publishes its channel guards and picks up reset requests
+CHANNEL_STATE_SECONDS = float(os.getenv("CHANNEL_STATE_SECONDS", "5"))
+
+
+async def _reset_guards(channels):
+    # Guard state belongs to the transport loop
+    for channel in channels:
+        channel_guards[channel].reset()
+        print(f"{channel} circuit reset on request")
+
+
+def sync_channel_state():
+    """Apply pending reset requests to this process's guards and publish their status.
+
+    Only the scheduler leader runs this: every production send goes through
+    its guards, so their state is what the API reports for all processes.
+    """
+    db = SessionLocal()
+    try:
+        rows = {row.channel: row for row in db.query(ChannelState).all()}
+        requested = {
+            channel: row.reset_requested_at for channel, row in rows.items()
+            if row.reset_requested_at is not None and channel in channel_guards
+        }
+        if requested:
+            transport.run(_reset_guards(list(requested)), timeout=10)
+
+        now = datetime.now()
+        for channel, guard in channel_guards.items():
+            row = rows.get(channel) or ChannelState(channel=channel)
+            row.status = json.dumps(guard.status())
+            row.updated_at = now
+            db.add(row)
+        db.flush()
+        for channel, requested_at in requested.items():
+            # A request made after we read it stays pending for the next sync
+            db.execute(
+                update(ChannelState)
+                .where(ChannelState.channel == channel, ChannelState.reset_requested_at == requested_at)
+                .values(reset_requested_at=None)
+            )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to sync channel state: {e}")
+    finally:
+        db.close()
+
+
+def _row_status(row: Optional[ChannelState], now: datetime) -> Optional[dict]:
+    if row is None or row.status is None:
+        return None
+    status = json.loads(row.status)
+    age = (now - row.updated_at).total_seconds()
+    if status.get("retry_in_seconds") is not None:
+        status["retry_in_seconds"] = round(max(0.0, status["retry_in_seconds"] - age), 1)
+    status["updated_at"] = row.updated_at
+    status["reset_pending"] = row.reset_requested_at is not None
+    return status
+
+
+def read_channel_state(db) -> Dict[str, Optional[dict]]:
+    """Last status the scheduler leader published per channel; None until it has"""
+    rows = {row.channel: row for row in db.query(ChannelState).all()}
+    now = datetime.now()
+    return {channel: _row_status(rows.get(channel), now) for channel in channel_guards}
+
+
+def request_channel_reset(db, channel: str) -> Optional[dict]:
+    """Ask the scheduler leader to close a channel's circuit on its next sync"""
+    row = db.get(ChannelState, channel) or ChannelState(channel=channel)
+    row.reset_requested_at = datetime.now()
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    return _row_status(row, datetime.now()) or {"updated_at": None, "reset_pending": True}
@@ -0,0 +1,56 @@
+import calendar
+from datetime import date, timedelta
+
+# Length of one cycle unit, in days for day/week and in months for month/year
+DAY_UNITS = {'day': 1, 'week': 7}
+MONTH_UNITS = {'month': 1, 'year': 12}
+
+
+def _add_months(start: date, months: int) -> date:
+    """Add months to a date, clamping the day to the end of the target month"""
+    total = start.year * 12 + (start.month - 1) + months
+    year, month = divmod(total, 12)
+    month += 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def add_cycles(start: date, cycle_val: int, cycle_unit: str, count: int = 1) -> date:
+    """Date that lies `count` billing cycles after `start`.
+
+    Months are counted from `start` itself, so Jan 31 plus two monthly
+    cycles is Mar 31 rather than the Mar 28 that stepping through Feb
+    would give.
+    """
+    if cycle_unit in DAY_UNITS:
+        return start + timedelta(days=DAY_UNITS[cycle_unit] * cycle_val * count)
+    if cycle_unit in MONTH_UNITS:
+        return _add_months(start, MONTH_UNITS[cycle_unit] * cycle_val * count)
+    return start
+
+
+def cycles_until(start: date, cycle_val: int, cycle_unit: str, target: date) -> int:
+    """Smallest count >= 1 for which add_cycles(start, ..., count) >= target"""
+    if not cycle_val or cycle_val < 0:
+        return 1
+
+    if cycle_unit in DAY_UNITS:
+        step = DAY_UNITS[cycle_unit] * cycle_val
+        gap = (target - start).days
+        return max(1, -(-gap // step))
+
+    if cycle_unit in MONTH_UNITS:
+        step = MONTH_UNITS[cycle_unit] * cycle_val
+        gap = (target.year - start.year) * 12 + (target.month - start.month)
+        count = max(1, gap // step)
+        # Day-of-month clamping can leave us just short of the target
+        while _add_months(start, step * count) < target:
+            count += 1
+        return count
+
+    return 1
+
+
+def advance_to(start: date, cycle_val: int, cycle_unit: str, target: date) -> date:
+    """Advance at least one cycle, and as many more as needed to reach target"""
+    return add_cycles(start, cycle_val, cycle_unit, cycles_until(start, cycle_val, cycle_unit, target))
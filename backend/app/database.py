@@ -1,22 +1,137 @@
 import os
-from sqlalchemy import create_engine, text
+import sqlite3
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 DB_PATH = os.getenv("DB_PATH", "/app/data/subkeeper.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+# Connection pragmas; DB_JOURNAL_MODE=DELETE restores SQLite's default rollback journal
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL").upper()
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-65536"))  # Negative values are KiB
+# GET routes read through separate read-only connections
+DB_READ_POOL = os.getenv("DB_READ_POOL", "true").lower() in ("1", "true", "yes")
+
+if DB_JOURNAL_MODE not in ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"):
+    raise ValueError(f"Unsupported DB_JOURNAL_MODE: {DB_JOURNAL_MODE}")
+if DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"Unsupported DB_SYNCHRONOUS: {DB_SYNCHRONOUS}")
 
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000}
 )
 
+read_engine = create_engine(
+    f"sqlite:///file:{DB_PATH}?mode=ro&uri=true",
+    connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000}
+) if DB_READ_POOL else engine
+
+def _apply_pragmas(dbapi_connection, read_only: bool):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only:
+            cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+        else:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+event.listen(engine, "connect", lambda conn, record: _apply_pragmas(conn, read_only=False))
+if read_engine is not engine:
+    event.listen(read_engine, "connect", lambda conn, record: _apply_pragmas(conn, read_only=True))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
+class WriterLock:
+    """Re-entrant lock that any thread may release.
+
+    A session's transaction can end on a different thread than the one
+    that started writing (FastAPI closes sync dependencies on whichever
+    threadpool thread is free), so unlike threading.RLock a release is
+    not tied to the acquiring thread. The thread that took the lock can
+    take it again for nested writers; it is free once every hold is
+    released.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._owner = None
+        self._holds = 0
+
+    def acquire(self, timeout: float) -> bool:
+        me = threading.get_ident()
+        with self._cond:
+            if self._holds and self._owner == me:
+                self._holds += 1
+                return True
+            if not self._cond.wait_for(lambda: self._holds == 0, timeout):
+                return False
+            self._owner = me
+            self._holds = 1
+            return True
+
+    def release(self):
+        with self._cond:
+            if not self._holds:
+                raise RuntimeError("release of an unheld writer lock")
+            self._holds -= 1
+            if not self._holds:
+                self._owner = None
+                self._cond.notify()
+
+# One writer at a time per process. Sessions take it when they first write
+# and hold it until their transaction ends, so writers queue here instead of
+# hitting SQLITE_BUSY on lock upgrades; other processes wait on busy_timeout.
+_write_lock = WriterLock()
+
+def _acquire_write_lock():
+    if not _write_lock.acquire(timeout=DB_BUSY_TIMEOUT_MS / 1000):
+        raise sqlite3.OperationalError("database is locked (timed out waiting for the writer)")
+
+@contextmanager
+def serialized_write():
+    """Hold the writer lock around writes made outside an ORM session"""
+    _acquire_write_lock()
+    try:
+        yield
+    finally:
+        _write_lock.release()
+
+def _claim_writer(session):
+    if not session.info.get("holds_write_lock"):
+        _acquire_write_lock()
+        session.info["holds_write_lock"] = True
+
+@event.listens_for(SessionLocal, "before_flush")
+def _writer_before_flush(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        _claim_writer(session)
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _writer_before_execute(orm_execute_state):
+    if not orm_execute_state.is_select:
+        _claim_writer(orm_execute_state.session)
+
+@event.listens_for(SessionLocal, "after_transaction_end")
+def _writer_release(session, transaction):
+    if transaction.parent is None and session.info.pop("holds_write_lock", False):
+        _write_lock.release()
+
 def get_db():
     db = SessionLocal()
     try:
@@ -24,88 +139,40 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session on the read-only pool, for routes that never write"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _schema_version(conn) -> int:
+    try:
+        return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+    except Exception:
+        conn.rollback()
+        return 0
+
 def run_migrations():
-    """Run database migrations to update schema"""
+    """Bring the schema up to SCHEMA_VERSION; a single query when it is already current"""
+    from .migrations import MIGRATIONS, SCHEMA_VERSION
     with engine.connect() as conn:
-        # Force add notification columns to subscriptions table
-        print("Adding notification columns to subscriptions table...")
-        result = conn.execute(text("PRAGMA table_info(subscriptions)"))
-        columns = [row[1] for row in result]
-        
-        if 'is_disabled' not in columns:
-            print("Adding is_disabled column to subscriptions table...")
-            conn.execute(text('ALTER TABLE subscriptions ADD COLUMN is_disabled BOOLEAN DEFAULT FALSE'))
-        else:
-            print("is_disabled column already exists in subscriptions table")
-        
-        # Migration for reminders table
-        print("Checking reminders table...")
-        result = conn.execute(text("PRAGMA table_info(reminders)"))
-        columns = [row[1] for row in result]
-        
-        if 'is_disabled' not in columns:
-            print("Adding is_disabled column to reminders table...")
-            conn.execute(text('ALTER TABLE reminders ADD COLUMN is_disabled BOOLEAN DEFAULT FALSE'))
-        else:
-            print("is_disabled column already exists in reminders table")
-        
-        try:
-            conn.execute(text('ALTER TABLE subscriptions ADD COLUMN notify_email BOOLEAN DEFAULT TRUE'))
-            print("Added notify_email column to subscriptions table")
-        except Exception:
-            print("notify_email column already exists in subscriptions table")
-        
-        try:
-            conn.execute(text('ALTER TABLE subscriptions ADD COLUMN notify_wechat BOOLEAN DEFAULT TRUE'))
-            print("Added notify_wechat column to subscriptions table")
-        except Exception:
-            print("notify_wechat column already exists in subscriptions table")
-        
-        try:
-            conn.execute(text('ALTER TABLE subscriptions ADD COLUMN notify_webhook BOOLEAN DEFAULT TRUE'))
-            print("Added notify_webhook column to subscriptions table")
-        except Exception:
-            print("notify_webhook column already exists in subscriptions table")
-        
-        try:
-            conn.execute(text('ALTER TABLE subscriptions ADD COLUMN notify_resend BOOLEAN DEFAULT TRUE'))
-            print("Added notify_resend column to subscriptions table")
-        except Exception:
-            print("notify_resend column already exists in subscriptions table")
-        
-        # Force add notification columns to reminders table
-        print("Adding notification columns to reminders table...")
-        try:
-            conn.execute(text('ALTER TABLE reminders ADD COLUMN notify_email BOOLEAN DEFAULT TRUE'))
-            print("Added notify_email column to reminders table")
-        except Exception:
-            print("notify_email column already exists in reminders table")
-        
-        try:
-            conn.execute(text('ALTER TABLE reminders ADD COLUMN notify_wechat BOOLEAN DEFAULT TRUE'))
-            print("Added notify_wechat column to reminders table")
-        except Exception:
-            print("notify_wechat column already exists in reminders table")
-        
-        try:
-            conn.execute(text('ALTER TABLE reminders ADD COLUMN notify_webhook BOOLEAN DEFAULT TRUE'))
-            print("Added notify_webhook column to reminders table")
-        except Exception:
-            print("notify_webhook column already exists in reminders table")
-        
-        try:
-            conn.execute(text('ALTER TABLE reminders ADD COLUMN notify_resend BOOLEAN DEFAULT TRUE'))
-            print("Added notify_resend column to reminders table")
-        except Exception:
-            print("notify_resend column already exists in reminders table")
-        
-        # Add remarks column to subscriptions table
-        print("Adding remarks column to subscriptions table...")
-        try:
-            conn.execute(text('ALTER TABLE subscriptions ADD COLUMN remarks TEXT'))
-            print("Added remarks column to subscriptions table")
-        except Exception:
-            print("remarks column already exists in subscriptions table")
-        
-        conn.commit()
-        print("Database migrations completed successfully!")
+        version = _schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return
+
+    with serialized_write(), engine.begin() as conn:
+        # Take SQLite's write lock up front so DDL and the version bump commit together
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        # Another process may have migrated while we waited for the writer
+        version = _schema_version(conn)
+        for step, description, migrate in MIGRATIONS:
+            if step <= version:
+                continue
+            print(f"Applying migration {step}: {description}...")
+            migrate(conn)
+            conn.execute(text("DELETE FROM schema_version"))
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": step})
+    print(f"Database schema is at version {SCHEMA_VERSION}")
@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, List
+
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "4"))
+DELIVERY_QUEUE_SIZE = int(os.getenv("DELIVERY_QUEUE_SIZE", "1000"))
+# How long the scheduler waits for room in a full queue before dropping a send
+DELIVERY_SUBMIT_TIMEOUT = float(os.getenv("DELIVERY_SUBMIT_TIMEOUT", "60"))
+DELIVERY_SHUTDOWN_TIMEOUT = float(os.getenv("DELIVERY_SHUTDOWN_TIMEOUT", "30"))
+
+_STOP = object()
+
+
+class DeliveryQueue:
+    """Bounded queue of outgoing sends drained by a pool of worker threads.
+
+    The scheduler only decides what is due and submits it here, so slow
+    channels no longer hold up the tick. A full queue makes submit() block,
+    which pushes back on the scheduler instead of growing without bound.
+    """
+
+    def __init__(self, workers: int = DELIVERY_WORKERS, maxsize: int = DELIVERY_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"delivery-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn: Callable, *args, timeout: float = DELIVERY_SUBMIT_TIMEOUT) -> bool:
+        """Queue fn(*args) for a worker; returns False if no room freed up in time"""
+        if not self._threads:
+            self.start()
+        try:
+            self._queue.put((fn, args), timeout=timeout)
+        except queue.Full:
+            print(f"Delivery queue full ({self._queue.maxsize}), dropping {getattr(fn, '__name__', fn)}")
+            return False
+        self.submitted += 1
+        return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                fn, args = item
+                try:
+                    fn(*args)
+                    self.completed += 1
+                except Exception:
+                    self.failed += 1
+                    print("Delivery worker error:")
+                    traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, timeout: float = DELIVERY_SHUTDOWN_TIMEOUT):
+        """Let workers finish what is already queued, then stop them"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        pending = self._queue.qsize()
+        if pending:
+            print(f"Draining {pending} queued deliveries...")
+        deadline = time.monotonic() + timeout
+        # Stop markers go in behind the queued work, so everything before them is sent
+        for _ in threads:
+            try:
+                self._queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        left = self._queue.qsize()
+        if left:
+            print(f"Delivery queue shutdown timed out with {left} items left")
+
+
+delivery_queue = DeliveryQueue()
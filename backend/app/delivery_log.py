@@ -0,0 +1,153 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import func, case, select
+from .database import engine, serialized_write
+from .models import DeliveryLog
+from .resilience import CircuitOpenError
+
+DELIVERY_LOG_FLUSH_SECONDS = float(os.getenv("DELIVERY_LOG_FLUSH_SECONDS", "2"))
+DELIVERY_LOG_BATCH_SIZE = 500
+# Records beyond this many unwritten ones are dropped rather than held in memory
+DELIVERY_LOG_MAX_PENDING = 50000
+
+
+class DeliveryLogWriter:
+    """Buffers delivery records and appends them to delivery_log in batches.
+
+    record() only appends to a list, so senders never wait on the
+    database; a background thread flushes every `flush_seconds` or as soon
+    as a full batch is waiting.
+    """
+
+    def __init__(self, flush_seconds: float = DELIVERY_LOG_FLUSH_SECONDS, batch_size: int = DELIVERY_LOG_BATCH_SIZE):
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, item_type: Optional[str], item_id: Optional[int], channel: str,
+               started_at: datetime, duration_ms: int, error: Optional[Exception] = None):
+        if error is None:
+            outcome = 'sent'
+        elif isinstance(error, CircuitOpenError):
+            outcome = 'rejected'
+        else:
+            outcome = 'failed'
+        row = {
+            "item_type": item_type, "item_id": item_id, "channel": channel,
+            "started_at": started_at, "duration_ms": duration_ms, "outcome": outcome,
+            "error": str(error)[:1000] if error is not None else None,
+        }
+        with self._lock:
+            if len(self._pending) >= DELIVERY_LOG_MAX_PENDING:
+                self.dropped += 1
+                return
+            self._pending.append(row)
+            size = len(self._pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="delivery-log", daemon=True)
+                self._thread.start()
+        if size >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                with serialized_write(), engine.begin() as conn:
+                    conn.execute(DeliveryLog.__table__.insert(), batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                print(f"Delivery log write failed, dropped {len(batch)} records: {e}")
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+
+delivery_log = DeliveryLogWriter()
+
+
+def query_delivery_log(db, item_type: Optional[str] = None, item_id: Optional[int] = None,
+                       channel: Optional[str] = None, outcome: Optional[str] = None,
+                       since: Optional[datetime] = None, before_id: Optional[int] = None, limit: int = 100):
+    """Newest records first; pass the last id seen as `before_id` for the next page"""
+    query = db.query(DeliveryLog)
+    if item_type is not None:
+        query = query.filter(DeliveryLog.item_type == item_type)
+    if item_id is not None:
+        query = query.filter(DeliveryLog.item_id == item_id)
+    if channel is not None:
+        query = query.filter(DeliveryLog.channel == channel)
+    if outcome is not None:
+        query = query.filter(DeliveryLog.outcome == outcome)
+    if since is not None:
+        query = query.filter(DeliveryLog.started_at >= since)
+    if before_id is not None:
+        query = query.filter(DeliveryLog.id < before_id)
+    return query.order_by(DeliveryLog.id.desc()).limit(limit).all()
+
+
+def delivery_stats(db, hours: float = 24) -> dict:
+    """Per-channel outcome counts, failure rate and p50/p95 latency over the last `hours`"""
+    since = datetime.now() - timedelta(hours=hours)
+    log = DeliveryLog.__table__
+
+    counts = db.execute(
+        select(
+            log.c.channel,
+            func.count(),
+            func.sum(case((log.c.outcome == 'sent', 1), else_=0)),
+            func.sum(case((log.c.outcome == 'failed', 1), else_=0)),
+            func.sum(case((log.c.outcome == 'rejected', 1), else_=0)),
+            func.avg(case((log.c.outcome != 'rejected', log.c.duration_ms))),
+        ).where(log.c.started_at >= since).group_by(log.c.channel)
+    ).all()
+
+    # Nearest-rank percentiles over attempted sends, ranked by duration within each channel
+    ranked = select(
+        log.c.channel,
+        log.c.duration_ms,
+        func.row_number().over(partition_by=log.c.channel, order_by=log.c.duration_ms).label("rn"),
+        func.count().over(partition_by=log.c.channel).label("n"),
+    ).where(log.c.started_at >= since, log.c.outcome != 'rejected').subquery()
+    percentiles = {
+        channel: (p50, p95) for channel, p50, p95 in db.execute(
+            select(
+                ranked.c.channel,
+                func.min(case((ranked.c.rn >= ranked.c.n * 0.5, ranked.c.duration_ms))),
+                func.min(case((ranked.c.rn >= ranked.c.n * 0.95, ranked.c.duration_ms))),
+            ).group_by(ranked.c.channel)
+        ).all()
+    }
+
+    stats = {}
+    for channel, total, sent, failed, rejected, avg_ms in counts:
+        attempted = sent + failed
+        p50, p95 = percentiles.get(channel, (None, None))
+        stats[channel] = {
+            "total": total,
+            "sent": sent,
+            "failed": failed,
+            "rejected": rejected,
+            "failure_rate": round(failed / attempted, 4) if attempted else None,
+            "avg_ms": round(avg_ms, 1) if avg_ms is not None else None,
+            "p50_ms": p50,
+            "p95_ms": p95,
+        }
+    return {"since": since, "hours": hours, "channels": stats}
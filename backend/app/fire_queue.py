@@ -0,0 +1,201 @@
+import heapq
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# Item kinds are packed into the heap key together with the row id
+KIND_SUBSCRIPTION = 0
+KIND_REMINDER = 1
+KINDS = {"subscription": KIND_SUBSCRIPTION, "reminder": KIND_REMINDER}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+
+
+def _pack(kind: str, item_id: int) -> int:
+    return item_id * 2 + KINDS[kind]
+
+
+def _unpack(key: int) -> Tuple[str, int]:
+    return KIND_NAMES[key & 1], key >> 1
+
+
+class FireQueue:
+    """Min-heap of upcoming fire instants keyed by (kind, id).
+
+    Entries are (timestamp, key) tuples in a plain list managed by heapq.
+    Rescheduling an item only records its new time and pushes a new entry;
+    superseded entries are discarded lazily when they reach the top.
+    """
+
+    __slots__ = ("_heap", "_current")
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._current = {}
+
+    def __len__(self):
+        return len(self._current)
+
+    def clear(self):
+        self._heap.clear()
+        self._current.clear()
+
+    def set(self, kind: str, item_id: int, when: Optional[datetime]):
+        """Schedule, reschedule or (with when=None) remove an item"""
+        key = _pack(kind, item_id)
+        if when is None:
+            self._current.pop(key, None)
+            return
+        ts = when.timestamp()
+        if self._current.get(key) == ts:
+            return
+        self._current[key] = ts
+        heapq.heappush(self._heap, (ts, key))
+        # Stale entries accumulate on frequent reschedules; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._heap = [(ts, key) for key, ts in self._current.items()]
+            heapq.heapify(self._heap)
+
+    def _discard_stale(self):
+        heap, current = self._heap, self._current
+        while heap and current.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_time(self) -> Optional[float]:
+        """Timestamp of the earliest scheduled item, or None when empty"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now_ts: float) -> List[Tuple[str, int]]:
+        """Remove and return every item scheduled at or before now_ts"""
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now_ts:
+                return due
+            _, key = heapq.heappop(self._heap)
+            del self._current[key]
+            due.append(_unpack(key))
+
+
+Entry = Tuple[str, int, Optional[datetime]]
+
+
+class FireEngine:
+    """Thread that sleeps until the next fire instant in a FireQueue.
+
+    ``loader`` returns every (kind, id, when) entry and is used for the
+    initial fill and for periodic resyncs. ``runner`` receives the due
+    (kind, id) pairs and returns the entries it rescheduled. ``version``,
+    if given, returns a counter that any process bumps when it changes
+    the data; it is polled every ``poll_seconds`` and the queue is
+    reloaded only when it moved, so changes made by other processes show
+    up without waiting for the next resync.
+    """
+
+    def __init__(self, loader: Callable[[], Iterable[Entry]],
+                 runner: Callable[[List[Tuple[str, int]]], Iterable[Entry]],
+                 resync_seconds: float = 300, version: Optional[Callable[[], int]] = None,
+                 poll_seconds: float = 1):
+        self.loader = loader
+        self.runner = runner
+        self.resync_seconds = resync_seconds
+        self.version = version
+        self.poll_seconds = poll_seconds
+        self._loaded_version = None
+        self.queue = FireQueue()
+        self._cond = threading.Condition()
+        self._reload_requested = True
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="fire-engine", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 5):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def update(self, kind: str, item_id: int, when: Optional[datetime]):
+        """Apply an incremental change and wake the thread if it moved the head"""
+        with self._cond:
+            self.queue.set(kind, item_id, when)
+            self._cond.notify()
+
+    def reload(self):
+        """Ask the thread to rebuild the queue from the loader"""
+        with self._cond:
+            self._reload_requested = True
+            self._cond.notify()
+
+    def _version_moved(self) -> bool:
+        try:
+            return self.version() != self._loaded_version
+        except Exception:
+            print("Fire engine version check error:")
+            traceback.print_exc()
+            return False
+
+    def _apply(self, entries: Iterable[Entry]):
+        with self._cond:
+            for kind, item_id, when in entries:
+                self.queue.set(kind, item_id, when)
+
+    def _run(self):
+        next_resync = 0.0
+        next_poll = 0.0
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                reload = self._reload_requested or time.time() >= next_resync
+                self._reload_requested = False
+
+            if not reload and self.version is not None and time.time() >= next_poll:
+                reload = self._version_moved()
+                next_poll = time.time() + self.poll_seconds
+
+            if reload:
+                try:
+                    if self.version is not None:
+                        # Read before loading, so a change committed during the load triggers another one
+                        self._loaded_version = self.version()
+                    entries = list(self.loader())
+                    with self._cond:
+                        self.queue.clear()
+                    self._apply(entries)
+                except Exception:
+                    print("Fire engine reload error:")
+                    traceback.print_exc()
+                next_resync = time.time() + self.resync_seconds
+
+            with self._cond:
+                due = self.queue.pop_due(time.time())
+
+            if due:
+                try:
+                    self._apply(self.runner(due))
+                except Exception:
+                    print("Fire engine run error:")
+                    traceback.print_exc()
+                continue
+
+            with self._cond:
+                if self._stopped or self._reload_requested:
+                    continue
+                wake_at = next_resync
+                if self.version is not None:
+                    wake_at = min(wake_at, next_poll)
+                head = self.queue.next_time()
+                if head is not None:
+                    wake_at = min(wake_at, head)
+                timeout = wake_at - time.time()
+                if timeout > 0:
+                    self._cond.wait(timeout)
@@ -0,0 +1,76 @@
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every process then acts as leader
+    fcntl = None
+
+
+class LeaderLease:
+    """Exclusive lease on the scheduler, backed by an fcntl lock file.
+
+    The kernel drops the lock when the holding process exits, so a standby
+    worker that retries every ``retry_seconds`` takes over within that bound
+    after the leader dies.
+    """
+
+    def __init__(self, path: str, retry_seconds: float = 5):
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self._fd: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def try_acquire(self) -> bool:
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self.is_leader = True
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # Record the holder for operators; the lock itself is what counts
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        self.is_leader = True
+        return True
+
+    def start(self, on_elected: Callable[[], None]):
+        """Call on_elected now if the lease is free, otherwise once it becomes free"""
+        self._stop.clear()
+        if self.try_acquire():
+            on_elected()
+            return
+
+        print(f"Scheduler lease held by another process, standing by (pid {os.getpid()})")
+
+        def wait_for_lease():
+            while not self._stop.wait(self.retry_seconds):
+                if self.try_acquire():
+                    print(f"Acquired scheduler lease (pid {os.getpid()})")
+                    on_elected()
+                    return
+
+        self._thread = threading.Thread(target=wait_for_lease, name="leader-lease", daemon=True)
+        self._thread.start()
+
+    def release(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.retry_seconds + 1)
+            self._thread = None
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.is_leader = False
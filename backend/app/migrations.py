@@ -0,0 +1,333 @@
+"""Schema migration steps.
+
+Each step is frozen: it works from the DDL, column lists and table
+definitions as they stood when the step was added, never from the live
+models, so a later model change cannot alter what an old step does.
+Schema changes go in a new step at the end of MIGRATIONS.
+"""
+
+from datetime import datetime
+from sqlalchemy import Boolean, Date, DateTime, Integer, String, Text, bindparam, column, table, text, update
+
+# Tables of step 1, each created together with its indexes when missing
+# (existing tables from early releases are left to steps 2 and 5)
+INITIAL_TABLES = {
+    "settings": [
+        """CREATE TABLE settings (
+            "key" VARCHAR NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY ("key")
+        )""",
+        'CREATE INDEX ix_settings_key ON settings ("key")',
+    ],
+    "subscriptions": [
+        """CREATE TABLE subscriptions (
+            id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            price FLOAT NOT NULL,
+            cycle_val INTEGER NOT NULL,
+            cycle_unit VARCHAR NOT NULL,
+            next_date DATE NOT NULL,
+            notify_mode VARCHAR,
+            cust_days TEXT,
+            cust_time VARCHAR,
+            last_sent DATETIME,
+            group_name VARCHAR,
+            is_disabled BOOLEAN,
+            remarks TEXT,
+            notify_email BOOLEAN,
+            notify_wechat BOOLEAN,
+            notify_webhook BOOLEAN,
+            notify_resend BOOLEAN,
+            next_notify_at DATETIME,
+            next_notify_offset INTEGER,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX ix_subscriptions_disabled_next_date ON subscriptions (is_disabled, next_date)",
+        "CREATE INDEX ix_subscriptions_disabled_next_notify ON subscriptions (is_disabled, next_notify_at)",
+        "CREATE INDEX ix_subscriptions_group_name ON subscriptions (group_name)",
+        "CREATE INDEX ix_subscriptions_id ON subscriptions (id)",
+        "CREATE INDEX ix_subscriptions_next_notify_at ON subscriptions (next_notify_at)",
+    ],
+    "reminders": [
+        """CREATE TABLE reminders (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            content TEXT,
+            target_date DATE NOT NULL,
+            target_time VARCHAR NOT NULL,
+            is_sent BOOLEAN,
+            group_name VARCHAR,
+            is_disabled BOOLEAN,
+            notify_email BOOLEAN,
+            notify_wechat BOOLEAN,
+            notify_webhook BOOLEAN,
+            notify_resend BOOLEAN,
+            next_notify_at DATETIME,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX ix_reminders_group_name ON reminders (group_name)",
+        "CREATE INDEX ix_reminders_id ON reminders (id)",
+        "CREATE INDEX ix_reminders_next_notify_at ON reminders (next_notify_at)",
+        "CREATE INDEX ix_reminders_sent_disabled_next_notify ON reminders (is_sent, is_disabled, next_notify_at)",
+        "CREATE INDEX ix_reminders_target_date ON reminders (target_date)",
+    ],
+    "job_runs": [
+        """CREATE TABLE job_runs (
+            job_id VARCHAR NOT NULL,
+            last_started_at DATETIME,
+            last_completed_at DATETIME,
+            last_duration_ms INTEGER,
+            PRIMARY KEY (job_id)
+        )""",
+    ],
+    "notification_outbox": [
+        """CREATE TABLE notification_outbox (
+            id INTEGER NOT NULL,
+            item_type VARCHAR NOT NULL,
+            item_id INTEGER,
+            channel VARCHAR NOT NULL,
+            title VARCHAR NOT NULL,
+            content TEXT NOT NULL,
+            state VARCHAR NOT NULL,
+            attempts INTEGER NOT NULL,
+            next_attempt_at DATETIME,
+            last_error TEXT,
+            created_at DATETIME NOT NULL,
+            sent_at DATETIME,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX ix_notification_outbox_id ON notification_outbox (id)",
+        "CREATE INDEX ix_notification_outbox_state_next_attempt ON notification_outbox (state, next_attempt_at)",
+    ],
+    "app_state": [
+        """CREATE TABLE app_state (
+            "key" VARCHAR NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY ("key")
+        )""",
+    ],
+    "delivery_log": [
+        """CREATE TABLE delivery_log (
+            id INTEGER NOT NULL,
+            item_type VARCHAR,
+            item_id INTEGER,
+            channel VARCHAR NOT NULL,
+            started_at DATETIME NOT NULL,
+            duration_ms INTEGER NOT NULL,
+            outcome VARCHAR NOT NULL,
+            error TEXT,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX ix_delivery_log_item ON delivery_log (item_type, item_id, started_at)",
+        "CREATE INDEX ix_delivery_log_started_at ON delivery_log (started_at)",
+    ],
+}
+
+# Columns added to tables created by early releases, as (column, DDL) per table
+LEGACY_COLUMNS = {
+    'subscriptions': [
+        ('is_disabled', 'BOOLEAN DEFAULT FALSE'),
+        ('notify_email', 'BOOLEAN DEFAULT TRUE'),
+        ('notify_wechat', 'BOOLEAN DEFAULT TRUE'),
+        ('notify_webhook', 'BOOLEAN DEFAULT TRUE'),
+        ('notify_resend', 'BOOLEAN DEFAULT TRUE'),
+        ('remarks', 'TEXT'),
+        ('next_notify_at', 'DATETIME'),
+        ('next_notify_offset', 'INTEGER'),
+    ],
+    'reminders': [
+        ('is_disabled', 'BOOLEAN DEFAULT FALSE'),
+        ('notify_email', 'BOOLEAN DEFAULT TRUE'),
+        ('notify_wechat', 'BOOLEAN DEFAULT TRUE'),
+        ('notify_webhook', 'BOOLEAN DEFAULT TRUE'),
+        ('notify_resend', 'BOOLEAN DEFAULT TRUE'),
+        ('next_notify_at', 'DATETIME'),
+    ],
+}
+
+# The columns step 4 reads and writes, typed so dates round-trip as the ORM stores them
+_subscriptions = table(
+    "subscriptions",
+    column("id", Integer), column("next_date", Date), column("notify_mode", String),
+    column("cust_days", Text), column("cust_time", String), column("last_sent", DateTime),
+    column("is_disabled", Boolean), column("next_notify_at", DateTime), column("next_notify_offset", Integer),
+)
+_reminders = table(
+    "reminders",
+    column("id", Integer), column("target_date", Date), column("target_time", String),
+    column("is_sent", Boolean), column("is_disabled", Boolean), column("next_notify_at", DateTime),
+)
+
+SCHEDULER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_id ON subscriptions (id)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_next_notify_at ON subscriptions (next_notify_at)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_disabled_next_notify ON subscriptions (is_disabled, next_notify_at)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_disabled_next_date ON subscriptions (is_disabled, next_date)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_group_name ON subscriptions (group_name)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_id ON reminders (id)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_next_notify_at ON reminders (next_notify_at)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_sent_disabled_next_notify ON reminders (is_sent, is_disabled, next_notify_at)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_target_date ON reminders (target_date)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_group_name ON reminders (group_name)",
+]
+
+ARCHIVE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS subscriptions_archive (
+        id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        archived_at DATETIME NOT NULL,
+        name VARCHAR NOT NULL,
+        price FLOAT NOT NULL,
+        cycle_val INTEGER NOT NULL,
+        cycle_unit VARCHAR NOT NULL,
+        next_date DATE NOT NULL,
+        notify_mode VARCHAR,
+        cust_days TEXT,
+        cust_time VARCHAR,
+        last_sent DATETIME,
+        group_name VARCHAR,
+        is_disabled BOOLEAN,
+        disabled_at DATETIME,
+        remarks TEXT,
+        notify_email BOOLEAN,
+        notify_wechat BOOLEAN,
+        notify_webhook BOOLEAN,
+        notify_resend BOOLEAN,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_archive_archived_at ON subscriptions_archive (archived_at)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_archive_item_id ON subscriptions_archive (item_id)",
+    """CREATE TABLE IF NOT EXISTS reminders_archive (
+        id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        archived_at DATETIME NOT NULL,
+        title VARCHAR NOT NULL,
+        content TEXT,
+        target_date DATE NOT NULL,
+        target_time VARCHAR NOT NULL,
+        is_sent BOOLEAN,
+        group_name VARCHAR,
+        is_disabled BOOLEAN,
+        notify_email BOOLEAN,
+        notify_wechat BOOLEAN,
+        notify_webhook BOOLEAN,
+        notify_resend BOOLEAN,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_archive_archived_at ON reminders_archive (archived_at)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_archive_item_id ON reminders_archive (item_id)",
+]
+
+LIST_QUERY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_name ON subscriptions (name)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_next_date ON subscriptions (next_date)",
+    "CREATE INDEX IF NOT EXISTS ix_subscriptions_group_next_date ON subscriptions (group_name, next_date)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_title ON reminders (title)",
+    "CREATE INDEX IF NOT EXISTS ix_reminders_group_target_date ON reminders (group_name, target_date)",
+]
+
+
+def _columns(conn, table_name: str) -> set:
+    return {row[1] for row in conn.execute(text(f"PRAGMA table_info({table_name})"))}
+
+
+def _run(conn, statements: list):
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _create_tables(conn):
+    existing = {name for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    for table_name, statements in INITIAL_TABLES.items():
+        if table_name not in existing:
+            _run(conn, statements)
+
+
+def _add_legacy_columns(conn):
+    for table_name, columns in LEGACY_COLUMNS.items():
+        existing = _columns(conn, table_name)
+        for column_name, ddl in columns:
+            if column_name not in existing:
+                conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}'))
+                print(f"Added {column_name} column to {table_name} table")
+
+
+def _normalize_notify_days(conn):
+    from .notify_schedule import normalize_stored_notify_days
+    normalize_stored_notify_days(conn)
+
+
+def _backfill_notify_schedule(conn):
+    from .notify_schedule import (
+        DEFAULT_NOTIFY_DAYS, DEFAULT_NOTIFY_TIME, compile_notify_days, subscription_notify_rule,
+        next_subscription_fire, next_reminder_fire
+    )
+    now = datetime.now()
+    stored = dict(conn.execute(text("SELECT key, value FROM settings WHERE key IN ('global_days', 'global_time')")).all())
+    global_days = compile_notify_days(stored["global_days"]) if "global_days" in stored else tuple(DEFAULT_NOTIFY_DAYS)
+    global_time = stored.get("global_time") or DEFAULT_NOTIFY_TIME
+
+    params = []
+    for row in conn.execute(_subscriptions.select()):
+        next_notify_at, next_notify_offset = None, None
+        if not row.is_disabled:
+            notify_days, notify_time = subscription_notify_rule(row, global_days, global_time)
+            next_notify_at, next_notify_offset = next_subscription_fire(
+                row.next_date, notify_days, notify_time, row.last_sent, now
+            )
+        params.append({"_id": row.id, "next_notify_at": next_notify_at, "next_notify_offset": next_notify_offset})
+    if params:
+        conn.execute(update(_subscriptions).where(_subscriptions.c.id == bindparam("_id")), params)
+
+    params = [{"_id": row.id, "next_notify_at": next_reminder_fire(row, now)} for row in conn.execute(_reminders.select())]
+    if params:
+        conn.execute(update(_reminders).where(_reminders.c.id == bindparam("_id")), params)
+
+
+def _create_scheduler_indexes(conn):
+    _run(conn, SCHEDULER_INDEXES)
+
+
+def _add_archive_tables(conn):
+    if 'disabled_at' not in _columns(conn, "subscriptions"):
+        conn.execute(text('ALTER TABLE subscriptions ADD COLUMN disabled_at DATETIME'))
+    # Already-disabled rows start their retention clock now
+    conn.execute(text("UPDATE subscriptions SET disabled_at = :now WHERE is_disabled AND disabled_at IS NULL"),
+                 {"now": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")})
+    _run(conn, ARCHIVE_TABLES)
+
+
+def _create_list_query_indexes(conn):
+    _run(conn, LIST_QUERY_INDEXES)
+
+
+def _add_outbox_claim_token(conn):
+    if 'claim_token' not in _columns(conn, "notification_outbox"):
+        conn.execute(text('ALTER TABLE notification_outbox ADD COLUMN claim_token VARCHAR'))
+
+
+
+def _add_channel_state(conn):
+    conn.execute(text("""CREATE TABLE IF NOT EXISTS channel_state (
+        channel VARCHAR NOT NULL,
+        status TEXT,
+        updated_at DATETIME,
+        reset_requested_at DATETIME,
+        PRIMARY KEY (channel)
+    )"""))
+
+
+# Ordered schema steps; append new ones, never reorder or edit applied ones
+MIGRATIONS = [
+    (1, "create tables", _create_tables),
+    (2, "add columns missing from early releases", _add_legacy_columns),
+    (3, "normalize stored notify days", _normalize_notify_days),
+    (4, "compute next_notify_at for existing rows", _backfill_notify_schedule),
+    (5, "add scheduler and list query indexes", _create_scheduler_indexes),
+    (6, "add disabled_at and archive tables", _add_archive_tables),
+    (7, "add list filter and sort indexes", _create_list_query_indexes),
+    (8, "add outbox claim tokens", _add_outbox_claim_token),
+    (9, "add channel state table", _add_channel_state),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
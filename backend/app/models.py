@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, Text, Index
 from sqlalchemy.dialects.sqlite import JSON
 from .database import Base
 
@@ -10,6 +10,17 @@ class Settings(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Due scan, heap engine load and scheduler status
+        Index("ix_subscriptions_disabled_next_notify", "is_disabled", "next_notify_at"),
+        # Daily renewal of lapsed subscriptions
+        Index("ix_subscriptions_disabled_next_date", "is_disabled", "next_date"),
+        Index("ix_subscriptions_group_name", "group_name"),
+        # List filters and sort keys; the rowid (id) tiebreak comes with every index
+        Index("ix_subscriptions_group_next_date", "group_name", "next_date"),
+        Index("ix_subscriptions_next_date", "next_date"),
+        Index("ix_subscriptions_name", "name"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -23,15 +34,28 @@ class Subscription(Base):
     last_sent = Column(DateTime, nullable=True)
     group_name = Column(String, default='default')  # Group name for subscription
     is_disabled = Column(Boolean, default=False)  # Disable functionality
+    disabled_at = Column(DateTime, nullable=True)  # When it was last disabled, for retention
     remarks = Column(Text, nullable=True)  # 备注字段
     # Custom notification switches
     notify_email = Column(Boolean, default=True)  # Enable email notification
     notify_wechat = Column(Boolean, default=True)  # Enable WeChat notification
     notify_webhook = Column(Boolean, default=True)  # Enable webhook notification
     notify_resend = Column(Boolean, default=True)  # Enable Resend notification
+    # Precomputed schedule, kept current by app.notify_schedule
+    next_notify_at = Column(DateTime, nullable=True, index=True)  # Next notification instant
+    next_notify_offset = Column(Integer, nullable=True)  # Days-before offset that instant belongs to
 
 class Reminder(Base):
     __tablename__ = "reminders"
+    __table_args__ = (
+        # Due scan, heap engine load and scheduler status
+        Index("ix_reminders_sent_disabled_next_notify", "is_sent", "is_disabled", "next_notify_at"),
+        Index("ix_reminders_target_date", "target_date"),
+        Index("ix_reminders_group_name", "group_name"),
+        # List filters and sort keys; the rowid (id) tiebreak comes with every index
+        Index("ix_reminders_group_target_date", "group_name", "target_date"),
+        Index("ix_reminders_title", "title"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -46,3 +70,109 @@ class Reminder(Base):
     notify_wechat = Column(Boolean, default=True)  # Enable WeChat notification
     notify_webhook = Column(Boolean, default=True)  # Enable webhook notification
     notify_resend = Column(Boolean, default=True)  # Enable Resend notification
+    # Precomputed schedule, kept current by app.notify_schedule
+    next_notify_at = Column(DateTime, nullable=True, index=True)  # Next notification instant
+
+class ArchivedSubscription(Base):
+    __tablename__ = "subscriptions_archive"
+    
+    # Rows moved out of subscriptions by app.retention; item_id is the original id
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False, index=True)
+    archived_at = Column(DateTime, nullable=False, index=True)
+    name = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    cycle_val = Column(Integer, nullable=False)
+    cycle_unit = Column(String, nullable=False)
+    next_date = Column(Date, nullable=False)
+    notify_mode = Column(String, default='global')
+    cust_days = Column(Text, nullable=True)
+    cust_time = Column(String, nullable=True)
+    last_sent = Column(DateTime, nullable=True)
+    group_name = Column(String, default='default')
+    is_disabled = Column(Boolean, default=False)
+    disabled_at = Column(DateTime, nullable=True)
+    remarks = Column(Text, nullable=True)
+    notify_email = Column(Boolean, default=True)
+    notify_wechat = Column(Boolean, default=True)
+    notify_webhook = Column(Boolean, default=True)
+    notify_resend = Column(Boolean, default=True)
+
+class ArchivedReminder(Base):
+    __tablename__ = "reminders_archive"
+    
+    # Rows moved out of reminders by app.retention; item_id is the original id
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False, index=True)
+    archived_at = Column(DateTime, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    content = Column(Text, nullable=True)
+    target_date = Column(Date, nullable=False)
+    target_time = Column(String, nullable=False)
+    is_sent = Column(Boolean, default=False)
+    group_name = Column(String, default='default')
+    is_disabled = Column(Boolean, default=False)
+    notify_email = Column(Boolean, default=True)
+    notify_wechat = Column(Boolean, default=True)
+    notify_webhook = Column(Boolean, default=True)
+    notify_resend = Column(Boolean, default=True)
+
+class AppState(Base):
+    __tablename__ = "app_state"
+    
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)  # Change counters polled by every process
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    
+    job_id = Column(String, primary_key=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_completed_at = Column(DateTime, nullable=True)  # Used to detect windows missed while down
+    last_duration_ms = Column(Integer, nullable=True)
+
+class ChannelState(Base):
+    __tablename__ = "channel_state"
+    
+    # Written by the scheduler leader, whose guards see every production send
+    channel = Column(String, primary_key=True)
+    status = Column(Text, nullable=True)  # JSON snapshot of the leader's ChannelGuard.status()
+    updated_at = Column(DateTime, nullable=True)
+    reset_requested_at = Column(DateTime, nullable=True)  # Set by the API, cleared once the leader applied it
+
+class OutboxMessage(Base):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        # The retry worker scans by state and due time
+        Index("ix_notification_outbox_state_next_attempt", "state", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    item_type = Column(String, nullable=False)  # 'subscription', 'reminder' or 'digest'
+    item_id = Column(Integer, nullable=True)
+    channel = Column(String, nullable=False)  # 'email', 'wechat', 'webhook' or 'resend'
+    title = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    state = Column(String, nullable=False, default='pending')  # 'pending', 'sending', 'sent' or 'dead'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    claim_token = Column(String, nullable=True)  # Set by the claim that holds a 'sending' row's lease
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+class DeliveryLog(Base):
+    __tablename__ = "delivery_log"
+    __table_args__ = (
+        Index("ix_delivery_log_item", "item_type", "item_id", "started_at"),
+    )
+    
+    # Append-only; rows are written in batches by app.delivery_log
+    id = Column(Integer, primary_key=True)
+    item_type = Column(String, nullable=True)  # 'subscription', 'reminder', 'digest', or NULL for test sends
+    item_id = Column(Integer, nullable=True)
+    channel = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False, index=True)
+    duration_ms = Column(Integer, nullable=False)
+    outcome = Column(String, nullable=False)  # 'sent', 'failed' or 'rejected' (circuit open, not attempted)
+    error = Column(Text, nullable=True)
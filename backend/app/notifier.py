@@ -1,48 +1,298 @@
 import smtplib
-import json
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import requests
+import asyncio
+import httpx
 from typing import Optional
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 import os
-import resend
+import time
+from .smtp_pool import smtp_pool
+from .transport import transport
+from .resilience import channel_guards, CircuitOpenError
+from .settings_store import settings_cache
+from .delivery_log import delivery_log
+
+CHANNELS = ("email", "wechat", "webhook", "resend")
+
+RESEND_API_URL = "https://api.resend.com"
+# Resend accepts at most this many emails per batch request
+RESEND_BATCH_LIMIT = 100
+
+class NotificationError(Exception):
+    """A channel rejected or failed to deliver a message"""
+
+def timed_outcome(outcome, timing: dict) -> tuple:
+    """(outcome, started, duration_ms) for the delivery log; sends turned away before
+    reaching the provider (unconfigured, circuit open) are logged with no duration"""
+    return outcome, timing.get("started") or datetime.now(), timing.get("duration_ms", 0)
+
+# WeChat errcodes meaning the access_token is invalid or has expired
+WECHAT_TOKEN_ERRCODES = {40001, 40014, 42001}
+
+class WeChatTokenCache:
+    """Process-wide WeChat access_token cache keyed by (corpid, secret).
+
+    Tokens are refreshed `margin` seconds before WeChat says they expire,
+    and only one sender per key fetches a new token at a time. All access
+    happens on the transport loop, so asyncio locks are enough.
+    """
+    
+    def __init__(self, margin: float = 300):
+        self.margin = margin
+        self._tokens = {}
+        self._locks = {}
+    
+    def _valid(self, key) -> Optional[str]:
+        entry = self._tokens.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+    
+    async def get(self, corpid: str, secret: str) -> str:
+        key = (corpid, secret)
+        token = self._valid(key)
+        if token:
+            return token
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another sender may have refreshed it while we waited
+            token = self._valid(key)
+            if token:
+                return token
+            token_data = await transport.get_json(
+                "wechat", "https://qyapi.weixin.qq.com/cgi-bin/gettoken",
+                params={"corpid": corpid, "corpsecret": secret}
+            )
+            token = token_data.get('access_token')
+            if not token:
+                raise NotificationError(f"WeChat gettoken failed: {token_data.get('errcode')} {token_data.get('errmsg')}")
+            expires_in = float(token_data.get('expires_in') or 7200)
+            self._tokens[key] = (token, time.monotonic() + max(0.0, expires_in - self.margin))
+            return token
+    
+    def invalidate(self, corpid: str, secret: str, token: str):
+        """Drop a token the API rejected, unless it was already replaced"""
+        key = (corpid, secret)
+        entry = self._tokens.get(key)
+        if entry and entry[0] == token:
+            self._tokens.pop(key, None)
+
+wechat_tokens = WeChatTokenCache()
 
 class Notifier:
-    def __init__(self, db_session):
+    def __init__(self, db_session, guards: Optional[dict] = None):
         self.db = db_session
+        # Per-channel ChannelGuards; test sends pass their own so they never touch the production circuits
+        self.guards = guards if guards is not None else channel_guards
         self._load_config()
     
     def _load_config(self):
-        from .models import Settings
+        settings = settings_cache.get(self.db)
+        
+        self.smtp_config = settings["smtp_conf"]
+        self.wechat_config = settings["wechat_conf"]
+        self.webhook_config = settings["webhook_conf"]
+        self.resend_config = settings["resend_conf"]
+    
+    def is_configured(self, channel: str) -> bool:
+        """Whether a channel has enough configuration to attempt a send"""
+        if channel == "email":
+            return bool(self.smtp_config)
+        if channel == "wechat":
+            return bool(self.wechat_config)
+        if channel == "webhook":
+            return bool(self.webhook_config and self.webhook_config.get('webhook_key'))
+        if channel == "resend":
+            return bool(self.resend_config)
+        return False
+    
+    def deliver(self, channel: str, title: str, content: str):
+        """Send on a single channel, raising NotificationError on failure"""
+        error = self.deliver_many([(channel, title, content)])[0]
+        if error is not None:
+            raise error
+    
+    async def deliver_async(self, channel: str, title: str, content: str, timing: Optional[dict] = None):
+        senders = {
+            "email": self._deliver_email,
+            "wechat": self._deliver_wechat,
+            "webhook": self._deliver_webhook,
+            "resend": self._deliver_resend,
+        }
+        if channel not in senders:
+            raise NotificationError(f"Unknown channel: {channel}")
+        if not self.is_configured(channel):
+            raise NotificationError(f"{channel} is not configured")
+        await self.guards[channel].call(senders[channel], title, content, timing=timing)
+    
+    def deliver_many(self, sends: list, items: Optional[list] = None) -> list:
+        """Send (channel, title, content) tuples concurrently.
+
+        Returns one entry per send: None on success, otherwise the
+        exception it raised. Total latency is that of the slowest send.
+        Every send is recorded in the delivery log against the matching
+        (item_type, item_id) from `items`.
+        """
+        # Several Resend emails are folded into batch requests
+        batched = [i for i, send in enumerate(sends) if send[0] == "resend" and self.is_configured("resend")]
+        if len(batched) < 2:
+            batched = []
+        in_batch = set(batched)
+        single = [i for i in range(len(sends)) if i not in in_batch]
+
+        async def timed(channel, title, content):
+            timing = {}
+            try:
+                outcome = await self.deliver_async(channel, title, content, timing=timing)
+            except Exception as e:
+                outcome = e
+            return timed_outcome(outcome, timing)
+
+        async def fan_out():
+            jobs = [timed(*sends[i]) for i in single]
+            if batched:
+                jobs.append(self._deliver_resend_batch([sends[i][1:] for i in batched]))
+            timings = await asyncio.gather(*jobs)
+            results = [None] * len(sends)
+            for i, timing in zip(single, timings):
+                results[i] = timing
+            if batched:
+                for i, timing in zip(batched, timings[-1]):
+                    results[i] = timing
+            return results
+
+        results = transport.run(fan_out()) if sends else []
+        for n, (send, (error, started, duration_ms)) in enumerate(zip(sends, results)):
+            item_type, item_id = items[n] if items else (None, None)
+            delivery_log.record(item_type, item_id, send[0], started, duration_ms, error)
+        return [error for error, _, _ in results]
+    
+    def _send_email_sync(self, msg):
+        # Pooled sessions can be dropped by the server between sends; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                with smtp_pool.connection(self.smtp_config) as server:
+                    server.send_message(msg)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+    
+    async def _deliver_email(self, subject: str, body: str):
+        msg = MIMEMultipart()
+        msg['From'] = self.smtp_config.get('from')
+        msg['To'] = self.smtp_config.get('to')
+        msg['Subject'] = subject
+        
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
         
-        smtp = self.db.query(Settings).filter(Settings.key == "smtp_conf").first()
-        wechat = self.db.query(Settings).filter(Settings.key == "wechat_conf").first()
-        webhook = self.db.query(Settings).filter(Settings.key == "webhook_conf").first()
-        resend_conf = self.db.query(Settings).filter(Settings.key == "resend_conf").first()
+        # smtplib is blocking; run it off the transport loop
+        await asyncio.to_thread(self._send_email_sync, msg)
+    
+    async def _deliver_wechat(self, title: str, content: str):
+        corpid, secret = self.wechat_config.get('corpid'), self.wechat_config.get('secret')
+        message = {
+            "touser": self.wechat_config.get('touser', '@all'),
+            "msgtype": "text",
+            "agentid": self.wechat_config.get('agentid'),
+            "text": {
+                "content": f"{title}\n\n{content}"
+            }
+        }
         
-        self.smtp_config = json.loads(smtp.value) if smtp else None
-        self.wechat_config = json.loads(wechat.value) if wechat else None
-        self.webhook_config = json.loads(webhook.value) if webhook and webhook.value else {"webhook_key": ""}
-        self.resend_config = json.loads(resend_conf.value) if resend_conf else None
+        # A cached token can be revoked early; refetch once and retry
+        for attempt in range(2):
+            access_token = await wechat_tokens.get(corpid, secret)
+            response = await transport.post(
+                "wechat", "https://qyapi.weixin.qq.com/cgi-bin/message/send",
+                params={"access_token": access_token}, json=message
+            )
+            result = response.json()
+            if result.get('errcode') in WECHAT_TOKEN_ERRCODES:
+                wechat_tokens.invalidate(corpid, secret, access_token)
+                continue
+            break
+        if result.get('errcode') != 0:
+            raise NotificationError(f"WeChat send failed: {result.get('errcode')} {result.get('errmsg')}")
+    
+    def _resend_headers(self) -> dict:
+        # The key travels with each request instead of living in module state
+        return {"Authorization": f"Bearer {self.resend_config.get('api_key')}"}
+    
+    def _resend_params(self, subject: str, body: str) -> dict:
+        return {
+            "from": self.resend_config.get('from'),
+            "to": [self.resend_config.get('to')],
+            "subject": subject,
+            "html": f"<p>{body.replace(chr(10), '<br>')}</p>"
+        }
+    
+    async def _deliver_resend(self, subject: str, body: str):
+        response = await transport.post(
+            "resend", f"{RESEND_API_URL}/emails",
+            headers=self._resend_headers(), json=self._resend_params(subject, body)
+        )
+        r = response.json()
+        if response.is_error or r.get('id') is None:
+            raise NotificationError(f"Resend send failed: {response.status_code} {r.get('message', r)}")
+    
+    async def _deliver_resend_batch(self, emails: list) -> list:
+        """Send (subject, body) pairs through Resend's batch endpoint.
+
+        Returns one (error or None, started, duration_ms) entry per email,
+        timed per batch request.
+        Permissive validation lets the rest of a batch go out when single
+        emails are rejected.
+        """
+        async def send_chunk(chunk):
+            response = await transport.post(
+                "resend", f"{RESEND_API_URL}/emails/batch",
+                headers={**self._resend_headers(), "x-batch-validation": "permissive"},
+                json=[self._resend_params(subject, body) for subject, body in chunk]
+            )
+            r = response.json()
+            if response.is_error:
+                raise NotificationError(f"Resend batch failed: {response.status_code} {r.get('message', r)}")
+            results = [None] * len(chunk)
+            for item in r.get('errors') or []:
+                results[item['index']] = NotificationError(f"Resend rejected email: {item.get('message')}")
+            if len(r.get('data') or []) + len(r.get('errors') or []) < len(chunk):
+                return [e or NotificationError(f"Resend batch returned no message id: {r}") for e in results]
+            return results
+
+        chunks = [emails[i:i + RESEND_BATCH_LIMIT] for i in range(0, len(emails), RESEND_BATCH_LIMIT)]
+        guard = self.guards["resend"]
+        timings = [{} for _ in chunks]
+        outcomes = await asyncio.gather(
+            *(guard.call(send_chunk, chunk, timing=timing) for chunk, timing in zip(chunks, timings)),
+            return_exceptions=True
+        )
+        results = []
+        for chunk, outcome, timing in zip(chunks, outcomes, timings):
+            errors = [outcome] * len(chunk) if isinstance(outcome, Exception) else outcome
+            results += [timed_outcome(error, timing) for error in errors]
+        return results
+    
+    async def _deliver_webhook(self, title: str, content: str):
+        payload = {
+            "msgtype": "text",
+            "text": {
+                "content": f"{title}\n\n{content}"
+            }
+        }
+        response = await transport.post(
+            "webhook", "https://qyapi.weixin.qq.com/cgi-bin/webhook/send",
+            params={"key": self.webhook_config.get('webhook_key')}, json=payload
+        )
+        response.raise_for_status() # 如果请求失败 (例如 4xx 或 5xx)，则会抛出异常
     
     def send_email(self, subject: str, body: str) -> bool:
         if not self.smtp_config:
             return False
         
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.smtp_config.get('from')
-            msg['To'] = self.smtp_config.get('to')
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            with smtplib.SMTP(self.smtp_config.get('host'), self.smtp_config.get('port')) as server:
-                if self.smtp_config.get('use_tls'):
-                    server.starttls()
-                server.login(self.smtp_config.get('username'), self.smtp_config.get('password'))
-                server.send_message(msg)
+            self.deliver("email", subject, body)
             return True
         except Exception as e:
             print(f"Email send failed: {e}")
@@ -53,43 +303,20 @@ class Notifier:
             return False
         
         try:
-            token_url = f"https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.wechat_config.get('corpid')}&corpsecret={self.wechat_config.get('secret')}"
-            token_resp = requests.get(token_url)
-            access_token = token_resp.json().get('access_token')
-            
-            if not access_token:
-                return False
-            
-            send_url = f"https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={access_token}"
-            message = {
-                "touser": self.wechat_config.get('touser', '@all'),
-                "msgtype": "text",
-                "agentid": self.wechat_config.get('agentid'),
-                "text": {
-                    "content": f"{title}\n\n{content}"
-                }
-            }
-            
-            resp = requests.post(send_url, json=message)
-            return resp.json().get('errcode') == 0
+            self.deliver("wechat", title, content)
+            return True
         except Exception as e:
             print(f"WeChat send failed: {e}")
             return False
     
     def send_notification(self, title: str, content: str, notify_email: bool = True, notify_wechat: bool = True, notify_webhook: bool = True, notify_resend: bool = True):
         """发送通知 - 支持邮件、企业微信、Webhook 和 Resend，可根据偏好开关"""
-        # 发送邮件
-        if notify_email:
-            self.send_email(title, content)
-        # 发送企业微信
-        if notify_wechat:
-            self.send_wechat(title, content)
-        # 发送 Webhook 通知
-        if notify_webhook:
-            self.send_webhook_notification(title, content)
-        # 发送 Resend 邮件
-        if notify_resend:
-            self.send_resend(title, content)
+        # 各渠道并发发送，耗时取决于最慢的渠道
+        flags = {"email": notify_email, "wechat": notify_wechat, "webhook": notify_webhook, "resend": notify_resend}
+        sends = [(channel, title, content) for channel in CHANNELS if flags[channel] and self.is_configured(channel)]
+        for (channel, _, _), error in zip(sends, self.deliver_many(sends)):
+            if error is not None:
+                print(f"{channel} send failed: {error}")
 
     def send_resend(self, subject: str, body: str) -> bool:
         """使用 Resend 发送邮件"""
@@ -97,46 +324,22 @@ class Notifier:
             return False
         
         try:
-            resend.api_key = self.resend_config.get('api_key')
-            
-            params = {
-                "from": self.resend_config.get('from'),
-                "to": [self.resend_config.get('to')],
-                "subject": subject,
-                "html": f"<p>{body.replace(chr(10), '<br>')}</p>"
-            }
-            
-            r = resend.Emails.send(params)
-            return r.get('id') is not None
+            self.deliver("resend", subject, body)
+            return True
         except Exception as e:
             print(f"Resend email send failed: {e}")
             return False
 
-    def send_webhook_notification(self, title: str, content: str):
+    def send_webhook_notification(self, title: str, content: str) -> bool:
         """发送通知到企业微信 Webhook"""
-        webhook_key = self.webhook_config.get('webhook_key', '') if self.webhook_config else ''
-        
-        if not webhook_key:
+        if not self.is_configured("webhook"):
             print('⚠️ 未配置企业微信 Webhook Key，跳过发送通知')
-            return
-
-        # 获取并格式化香港时间
-        hkt = timezone(timedelta(hours=8), 'HKT')
-        hkt_time_str = datetime.now(hkt).strftime('%Y-%m-%d %H:%M:%S %Z')
-        
-        full_message = f"{title}\n\n{content}"
-        
-        url = f"https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key={webhook_key}"
-        payload = {
-            "msgtype": "text",
-            "text": {
-                "content": full_message
-            }
-        }
+            return False
         
         try:
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status() # 如果请求失败 (例如 4xx 或 5xx)，则会抛出异常
+            self.deliver("webhook", title, content)
             print('✅ 企业微信 Webhook 通知发送成功')
-        except requests.RequestException as e:
-            print(f'⚠️ 企业微信 Webhook 通知发送失败: {e}')
\ No newline at end of file
+            return True
+        except (httpx.HTTPError, NotificationError, CircuitOpenError, TimeoutError) as e:
+            print(f'⚠️ 企业微信 Webhook 通知发送失败: {e}')
+            return False
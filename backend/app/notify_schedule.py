@@ -0,0 +1,185 @@
+from datetime import datetime, date, time, timedelta
+from typing import Optional, Tuple
+from functools import lru_cache
+import json
+from sqlalchemy import text
+from .database import SessionLocal
+from .models import Subscription, Reminder
+
+DEFAULT_NOTIFY_DAYS = [3, 1, 0]
+DEFAULT_NOTIFY_TIME = "09:00"
+
+
+@lru_cache(maxsize=256)
+def parse_notify_time(value: Optional[str], default: str = DEFAULT_NOTIFY_TIME) -> time:
+    """Parse an HH:MM string, falling back to the default time"""
+    for candidate in (value, default):
+        if not candidate:
+            continue
+        try:
+            return datetime.strptime(candidate.strip(), "%H:%M").time()
+        except ValueError:
+            continue
+    return time(9, 0)
+
+
+def parse_notify_days(value) -> list:
+    """Normalize notify days to a sorted (descending) list of unique integers.
+
+    Accepts a list, a JSON array string (single quotes tolerated), a
+    comma-separated string such as "3,1,0" or a single number. Entries
+    that are not integers are dropped.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return []
+        try:
+            value = json.loads(text.replace("'", '"'))
+        except json.JSONDecodeError:
+            value = text.strip('[]').split(',')
+        if isinstance(value, str):
+            value = value.strip('[]').split(',')
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+
+    days = set()
+    for item in value:
+        if isinstance(item, bool):
+            continue
+        if isinstance(item, str):
+            item = item.strip()
+            if not item.lstrip('-').isdigit():
+                continue
+        try:
+            days.add(int(item))
+        except (TypeError, ValueError):
+            continue
+    return sorted(days, reverse=True)
+
+
+def dump_notify_days(value) -> str:
+    """Canonical JSON text stored in cust_days / global_days"""
+    return json.dumps(parse_notify_days(value))
+
+
+@lru_cache(maxsize=4096)
+def compile_notify_days(text: Optional[str]) -> Tuple[int, ...]:
+    """Stored notify days as an integer tuple; parsed once per distinct value"""
+    return tuple(parse_notify_days(text))
+
+
+def load_global_notify_settings(db) -> Tuple[Tuple[int, ...], str]:
+    """Return (global_days, global_time) from the cached settings"""
+    from .settings_store import settings_cache
+    settings = settings_cache.get(db)
+    return settings["global_days"], settings["global_time"]
+
+
+def subscription_notify_rule(sub, global_days, global_time) -> Tuple[Tuple[int, ...], str]:
+    """Return the (notify_days, notify_time) that apply to a subscription"""
+    if sub.notify_mode == 'global':
+        return global_days, global_time
+    return compile_notify_days(sub.cust_days), sub.cust_time or DEFAULT_NOTIFY_TIME
+
+
+def next_subscription_fire(next_date: date, notify_days, notify_time: str,
+                           last_sent: Optional[datetime], now: datetime) -> Tuple[Optional[datetime], Optional[int]]:
+    """Earliest notification instant (and its day offset) not yet handled.
+
+    A subscription is notified at most once per day, so if it was already
+    sent today the search starts from tomorrow.
+    """
+    start = now.date()
+    if last_sent and last_sent.date() == start:
+        start = start + timedelta(days=1)
+
+    fire_time = parse_notify_time(notify_time)
+    best_day, best_offset = None, None
+    for offset in notify_days:
+        fire_day = next_date - timedelta(days=offset)
+        if fire_day < start:
+            continue
+        if best_day is None or fire_day < best_day:
+            best_day, best_offset = fire_day, offset
+
+    if best_day is None:
+        return None, None
+    return datetime.combine(best_day, fire_time), best_offset
+
+
+def next_reminder_fire(reminder, now: datetime) -> Optional[datetime]:
+    """Fire instant of a pending reminder; past-day reminders never fire"""
+    if reminder.is_sent or reminder.is_disabled:
+        return None
+    if reminder.target_date < now.date():
+        return None
+    return datetime.combine(reminder.target_date, parse_notify_time(reminder.target_time))
+
+
+def refresh_subscription(sub, global_days, global_time, now: Optional[datetime] = None):
+    """Recompute and store next_notify_at / next_notify_offset on a subscription"""
+    if sub.is_disabled:
+        sub.next_notify_at, sub.next_notify_offset = None, None
+        return
+    notify_days, notify_time = subscription_notify_rule(sub, global_days, global_time)
+    sub.next_notify_at, sub.next_notify_offset = next_subscription_fire(
+        sub.next_date, notify_days, notify_time, sub.last_sent, now or datetime.now()
+    )
+
+
+def refresh_reminder(reminder, now: Optional[datetime] = None):
+    """Recompute and store next_notify_at on a reminder"""
+    reminder.next_notify_at = next_reminder_fire(reminder, now or datetime.now())
+
+
+def refresh_subscription_for(db, sub):
+    """Recompute a single subscription using the current global settings"""
+    global_days, global_time = load_global_notify_settings(db)
+    refresh_subscription(sub, global_days, global_time)
+
+
+def rebuild_notify_schedule(db=None, only_global: bool = False):
+    """Recompute next_notify_at for every row (or only global-mode subscriptions)"""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        now = datetime.now()
+        global_days, global_time = load_global_notify_settings(db)
+
+        query = db.query(Subscription)
+        if only_global:
+            query = query.filter(Subscription.notify_mode == 'global')
+        for sub in query.all():
+            refresh_subscription(sub, global_days, global_time, now)
+
+        if not only_global:
+            for reminder in db.query(Reminder).all():
+                refresh_reminder(reminder, now)
+
+        from .response_cache import response_cache
+        response_cache.mark_changed(db)
+        db.commit()
+    finally:
+        if own_session:
+            db.close()
+
+
+def normalize_stored_notify_days(conn):
+    """One-time rewrite of legacy cust_days / global_days values into canonical form"""
+    rows = conn.execute(text("SELECT id, cust_days FROM subscriptions WHERE cust_days IS NOT NULL")).fetchall()
+    changed = [
+        {"id": row_id, "cust_days": dump_notify_days(raw)}
+        for row_id, raw in rows
+        if dump_notify_days(raw) != raw
+    ]
+    if changed:
+        conn.execute(text("UPDATE subscriptions SET cust_days = :cust_days WHERE id = :id"), changed)
+
+    raw = conn.execute(text("SELECT value FROM settings WHERE key = 'global_days'")).scalar()
+    if raw is not None and dump_notify_days(raw) != raw:
+        conn.execute(text("UPDATE settings SET value = :value WHERE key = 'global_days'"), {"value": dump_notify_days(raw)})
+    print(f"Normalized cust_days for {len(changed)} subscriptions")
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import func, update, bindparam
+from .database import SessionLocal
+from .models import OutboxMessage
+from .settings_store import settings_cache
+from .notifier import Notifier, CHANNELS
+from .delivery import delivery_queue
+from .resilience import CircuitOpenError
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", str(6 * 3600)))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# A claimed row that is still 'sending' after this long is assumed lost and retried;
+# deliver() renews the lease while its sends are in flight
+OUTBOX_CLAIM_SECONDS = 300
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Exponential backoff after the given number of failed attempts"""
+    seconds = OUTBOX_BACKOFF_SECONDS * (2 ** max(0, attempts - 1))
+    return timedelta(seconds=min(seconds, OUTBOX_BACKOFF_MAX_SECONDS))
+
+
+def new_claim_token() -> str:
+    return uuid.uuid4().hex
+
+
+def add_messages(db, notifier: Notifier, item_type: str, item_id, title: str, content: str,
+                 notify_email: bool = True, notify_wechat: bool = True,
+                 notify_webhook: bool = True, notify_resend: bool = True,
+                 claim_token: str = None) -> List[OutboxMessage]:
+    """Add one outbox row per enabled and configured channel, claimed for immediate delivery.
+
+    Rows are only added to the session; the caller commits them together
+    with whatever marks the item as sent, then hands them to deliver()
+    with the same `claim_token`.
+    """
+    flags = {"email": notify_email, "wechat": notify_wechat, "webhook": notify_webhook, "resend": notify_resend}
+    now = datetime.now()
+    messages = []
+    for channel in CHANNELS:
+        if not flags[channel] or not notifier.is_configured(channel):
+            continue
+        message = OutboxMessage(
+            item_type=item_type, item_id=item_id, channel=channel,
+            title=title, content=content,
+            state='sending', attempts=0,
+            next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS),
+            claim_token=claim_token, created_at=now,
+        )
+        db.add(message)
+        messages.append(message)
+    return messages
+
+
+DEFAULT_DIGEST_CONF = {"enabled": False, "groups": {}}
+
+
+def load_digest_conf(db) -> dict:
+    """Digest settings: a global switch plus per-group overrides"""
+    return settings_cache.get(db)["digest_conf"]
+
+
+def uses_digest(digest_conf: dict, group_name) -> bool:
+    """Whether items of a group are merged into the per-tick digest"""
+    groups = digest_conf["groups"]
+    if group_name in groups:
+        return groups[group_name]
+    return digest_conf["enabled"]
+
+
+def add_digest_messages(db, notifier: Notifier, entries: list, claim_token: str = None) -> List[OutboxMessage]:
+    """Merge due items into one outbox row per channel.
+
+    `entries` holds (title, content, notify_email, notify_wechat,
+    notify_webhook, notify_resend) tuples; each channel's digest only
+    includes the items that have that channel switched on.
+    """
+    now = datetime.now()
+    messages = []
+    for index, channel in enumerate(CHANNELS):
+        parts = [f"【{title}】\n{content}" for title, content, *flags in entries if flags[index]]
+        if not parts or not notifier.is_configured(channel):
+            continue
+        message = OutboxMessage(
+            item_type="digest", item_id=None, channel=channel,
+            title=f"提醒汇总: {len(parts)} 项",
+            content="\n\n".join(parts),
+            state='sending', attempts=0,
+            next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS),
+            claim_token=claim_token, created_at=now,
+        )
+        db.add(message)
+        messages.append(message)
+    return messages
+
+
+def renew_claim(message_ids: List[int], claim_token: str) -> int:
+    """Push back the lease of the rows `claim_token` still holds; returns how many it holds"""
+    db = SessionLocal()
+    try:
+        held = db.query(OutboxMessage).filter(
+            OutboxMessage.id.in_(message_ids),
+            OutboxMessage.claim_token == claim_token,
+            OutboxMessage.state == 'sending'
+        ).update({"next_attempt_at": datetime.now() + timedelta(seconds=OUTBOX_CLAIM_SECONDS)},
+                 synchronize_session=False)
+        db.commit()
+        return held
+    finally:
+        db.close()
+
+
+@contextmanager
+def held_claim(message_ids: List[int], claim_token: str):
+    """Renew the claim's lease every third of OUTBOX_CLAIM_SECONDS while the block runs.
+
+    Rate-limited sends can take longer than one lease; without renewal
+    the retry job would claim rows that are still in flight and send
+    them again.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(OUTBOX_CLAIM_SECONDS / 3):
+            try:
+                renew_claim(message_ids, claim_token)
+            except Exception as e:
+                print(f"Outbox lease renewal failed: {e}")
+
+    thread = threading.Thread(target=beat, name="outbox-lease", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def deliver(message_ids: List[int], claim_token: str):
+    """Delivery worker task: attempt each row the claim holds once and record the outcomes"""
+    db = SessionLocal()
+    try:
+        notifier = Notifier(db)
+        messages = db.query(
+            OutboxMessage.id, OutboxMessage.item_type, OutboxMessage.item_id, OutboxMessage.channel,
+            OutboxMessage.title, OutboxMessage.content, OutboxMessage.attempts
+        ).filter(
+            OutboxMessage.id.in_(message_ids),
+            OutboxMessage.state == 'sending',
+            OutboxMessage.claim_token == claim_token
+        ).all()
+        db.rollback()  # Don't keep a read snapshot open while sending
+        if not messages:
+            return
+        # All rows of the batch go out concurrently, so each item's channels fan out in parallel
+        with held_claim([m.id for m in messages], claim_token):
+            errors = notifier.deliver_many([(m.channel, m.title, m.content) for m in messages],
+                                           [(m.item_type, m.item_id) for m in messages])
+        now = datetime.now()
+        params = []
+        for message, e in zip(messages, errors):
+            row = {"_id": message.id, "_claim": claim_token, "claim_token": None, "state": 'pending',
+                   "attempts": message.attempts, "next_attempt_at": None, "last_error": None, "sent_at": None}
+            if isinstance(e, CircuitOpenError):
+                # Never attempted: wait for the breaker without using up an attempt
+                row["next_attempt_at"] = now + max(backoff_delay(message.attempts),
+                                                   timedelta(seconds=e.retry_at - time.monotonic()))
+                row["last_error"] = str(e)
+            elif e is not None:
+                row["attempts"] += 1
+                row["last_error"] = str(e)[:1000]
+                if row["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                    row["state"] = 'dead'
+                    print(f"Outbox message {message.id} ({message.channel}) dead after {row['attempts']} attempts: {e}")
+                else:
+                    row["next_attempt_at"] = now + backoff_delay(row["attempts"])
+                    print(f"Outbox message {message.id} ({message.channel}) failed, retrying at {row['next_attempt_at']}: {e}")
+            else:
+                row["attempts"] += 1
+                row["state"] = 'sent'
+                row["sent_at"] = now
+            params.append(row)
+        table = OutboxMessage.__table__
+        # Only rows this claim still holds; a row whose lease was lost belongs to its new claimer
+        result = db.execute(
+            update(table).where(table.c.id == bindparam("_id"), table.c.claim_token == bindparam("_claim")),
+            params
+        )
+        db.commit()
+        if result.rowcount != len(params):
+            print(f"Outbox claim {claim_token} lost {len(params) - result.rowcount} rows before recording them")
+    finally:
+        db.close()
+
+
+def claim_due(db, claim_token: str, limit: int = OUTBOX_BATCH_SIZE) -> List[int]:
+    """Claim up to `limit` rows whose next attempt is due for `claim_token`; returns their ids"""
+    now = datetime.now()
+    ids = [row_id for (row_id,) in db.query(OutboxMessage.id).filter(
+        OutboxMessage.state.in_(('pending', 'sending')),
+        OutboxMessage.next_attempt_at <= now
+    ).order_by(OutboxMessage.next_attempt_at).limit(limit).all()]
+    if not ids:
+        return []
+    table = OutboxMessage.__table__
+    # Re-check due-ness in the UPDATE, so a row claimed by another process in between is skipped
+    claimed = db.execute(
+        update(table).where(
+            table.c.id.in_(ids),
+            table.c.state.in_(('pending', 'sending')),
+            table.c.next_attempt_at <= now
+        ).values(state='sending', next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS),
+                 claim_token=claim_token)
+        .returning(table.c.id)
+    ).scalars().all()
+    db.commit()
+    return claimed
+
+
+def outbox_retry_job():
+    """Hand every due outbox row to the delivery workers, one batch at a time"""
+    db = SessionLocal()
+    try:
+        while True:
+            claim_token = new_claim_token()
+            ids = claim_due(db, claim_token)
+            if not ids:
+                return
+            delivery_queue.submit(deliver, ids, claim_token)
+            if len(ids) < OUTBOX_BATCH_SIZE:
+                return
+    except Exception as e:
+        db.rollback()
+        print(f"Outbox retry job error: {e}")
+    finally:
+        db.close()
+
+
+def outbox_counts(db) -> dict:
+    """Number of outbox rows in each state"""
+    return dict(db.query(OutboxMessage.state, func.count()).group_by(OutboxMessage.state).all())
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import date
+from typing import Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_, func, literal
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    """Opaque cursor holding the sort key and id of the last row on a page"""
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if column.type.python_type is date:
+            sort_value = date.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def prefix_filter(column, prefix: str):
+    """Case-sensitive prefix match written as a range, so it can use an index"""
+    return (column >= prefix) & (column < prefix + "\U0010ffff")
+
+
+def paginate(query, model, sort_columns: dict, sort: str, order: str, cursor: Optional[str],
+             limit: Optional[int], response: Response, include_total: bool = False):
+    """Keyset-paginate `query` by (sort column, id).
+
+    `sort_columns` maps the public sort names to non-null columns. The next
+    page's cursor goes in the X-Next-Cursor header and, when asked for, the
+    number of rows matching the filters in X-Total-Count; the body stays a
+    plain list. Without `limit` every matching row is returned.
+    """
+    if sort not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(sort_columns)}")
+    column = sort_columns[sort]
+    key = tuple_(column, model.id)
+
+    if include_total:
+        total = query.order_by(None).with_entities(func.count(model.id)).scalar()
+        response.headers["X-Total-Count"] = str(total)
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, column)
+        after = tuple_(literal(sort_value, column.type), literal(row_id, model.id.type))
+        query = query.filter(key < after if order == "desc" else key > after)
+    if order == "desc":
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column.asc(), model.id.asc())
+
+    if limit is None:
+        return query.all()
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, column.key), last.id)
+    return rows
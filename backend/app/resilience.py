@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# Consecutive failures that open a channel's circuit
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# How long an open circuit fails fast before one probe send is let through
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "60"))
+# Provider quotas as "channel=count/seconds"; WeChat group robots allow 20 messages a minute
+CHANNEL_RATE_LIMITS = os.getenv("CHANNEL_RATE_LIMITS", "email=5/1,wechat=20/1,webhook=20/60,resend=2/1")
+# Upper bound on a whole send, on top of the transport's connect/read timeouts
+CHANNEL_DEADLINES = {"email": 45.0, "wechat": 20.0, "webhook": 15.0, "resend": 20.0}
+
+
+def parse_rate_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "channel=count/seconds,..." into {channel: (tokens per second, burst)}"""
+    limits = {}
+    for part in value.split(","):
+        if "=" not in part:
+            continue
+        channel, rate = part.split("=", 1)
+        count, _, seconds = rate.partition("/")
+        count, seconds = float(count), float(seconds or 1)
+        limits[channel.strip()] = (count / seconds, count)
+    return limits
+
+
+class CircuitOpenError(Exception):
+    """A channel is failing fast after repeated errors"""
+
+    def __init__(self, channel: str, retry_at: float):
+        self.channel = channel
+        self.retry_at = retry_at
+        super().__init__(f"{channel} circuit open, retry in {max(0.0, retry_at - time.monotonic()):.0f}s")
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` per second, holding at most `burst` tokens"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChannelGuard:
+    """Rate limit, circuit breaker and deadline wrapped around one channel's sends.
+
+    Guards are only used from the transport loop, so they need no locks.
+    The breaker opens after `threshold` consecutive failures, rejects
+    sends until `reset_seconds` have passed, then lets a single probe
+    through: success closes it again, failure re-opens it. With
+    `breaker=False` failures are only counted.
+    """
+
+    def __init__(self, channel: str, rate: float, burst: float, deadline: float,
+                 threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS,
+                 breaker: bool = True):
+        self.channel = channel
+        self.breaker = breaker
+        self.bucket = TokenBucket(rate, burst)
+        self.deadline = deadline
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def _before_call(self):
+        if self.state == "closed":
+            return
+        if self.state == "open" and time.monotonic() >= self.opened_until:
+            self.state = "half_open"
+            print(f"{self.channel} circuit half-open, probing")
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.channel, self.opened_until)
+
+    def _record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            print(f"{self.channel} circuit closed")
+        self.state = "closed"
+
+    def _record_failure(self, error: Exception):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)[:200] or type(error).__name__
+        if not self.breaker:
+            return
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                print(f"{self.channel} circuit open after {self.consecutive_failures} failures: {self.last_error}")
+            self.state = "open"
+            self.opened_until = time.monotonic() + self.reset_seconds
+
+    async def call(self, fn, *args, timing: Optional[dict] = None):
+        """Await fn(*args) under the guard, failing fast while the circuit is open
+
+        A `timing` dict gets the send's "started" and "duration_ms", measured
+        from when the token was granted so rate-limit waits are left out.
+        """
+        self._before_call()
+        await self.bucket.acquire()
+        # The breaker may have opened while this send waited for a token
+        if self.state == "open":
+            self._before_call()
+        if timing is not None:
+            timing["started"] = datetime.now()
+        t0 = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(*args), self.deadline)
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"{self.channel} send exceeded {self.deadline:g}s deadline")
+            self._record_failure(error)
+            raise error from None
+        except asyncio.CancelledError:
+            # An abandoned probe must not leave the circuit half-open forever
+            if self.state == "half_open":
+                self.state = "open"
+            raise
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        finally:
+            if timing is not None:
+                timing["duration_ms"] = int((time.monotonic() - t0) * 1000)
+        self._record_success()
+        return result
+
+    def reset(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+
+    def status(self) -> dict:
+        # Read-only snapshot; the bucket itself is only refilled on the transport loop
+        bucket = self.bucket
+        tokens = min(bucket.burst, bucket.tokens + (time.monotonic() - bucket._updated) * bucket.rate)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(max(0.0, self.opened_until - time.monotonic()), 1) if self.state == "open" else None,
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "tokens": round(tokens, 2),
+            "deadline_seconds": self.deadline,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+
+_limits = parse_rate_limits(CHANNEL_RATE_LIMITS)
+channel_guards: Dict[str, ChannelGuard] = {
+    channel: ChannelGuard(channel, *_limits.get(channel, (10.0, 10.0)), deadline)
+    for channel, deadline in CHANNEL_DEADLINES.items()
+}
+# Test sends from the settings page try out unsaved configs: same rate limits and
+# deadlines, but no breaker, so they neither trip nor wait on the production circuits
+test_channel_guards: Dict[str, ChannelGuard] = {
+    channel: ChannelGuard(f"{channel} (test)", *_limits.get(channel, (10.0, 10.0)), deadline, breaker=False)
+    for channel, deadline in CHANNEL_DEADLINES.items()
+}
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from fastapi import Request, Response
+from sqlalchemy import event
+from .settings_store import bump_version, read_version
+
+# How often a process checks whether another process (e.g. the scheduler) changed the data
+RESPONSE_CACHE_POLL_SECONDS = float(os.getenv("RESPONSE_CACHE_POLL_SECONDS", "1"))
+# Distinct URLs (path plus query string) kept per data version
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+DATA_VERSION_KEY = "data_version"
+# Response headers set by the handler that are part of the cached representation
+CACHED_HEADERS = ("X-Next-Cursor", "X-Total-Count")
+
+
+class ResponseCache:
+    """Serialized JSON bodies of read endpoints, valid for one data version.
+
+    Every transaction that changes subscriptions, reminders or settings
+    calls mark_changed(), which bumps a counter in app_state. Readers
+    re-check that counter at most every `poll_seconds` (immediately after
+    a change committed in this process), and a cached body is only served
+    while the version it was built from is current. Each body carries a
+    content hash as its ETag, so clients revalidating with If-None-Match
+    get a 304 without the query or serialization running.
+    """
+
+    def __init__(self, poll_seconds: float = RESPONSE_CACHE_POLL_SECONDS, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.poll_seconds = poll_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # url -> (version, etag, body, headers)
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _current_version(self, db) -> int:
+        if self._version is not None and time.monotonic() - self._checked < self.poll_seconds:
+            return self._version
+        version = read_version(db, DATA_VERSION_KEY)
+        with self._lock:
+            self._observe(version)
+            self._checked = time.monotonic()
+        return version
+
+    def _observe(self, version: int):
+        # Caller holds the lock; entries from older versions can never match again
+        if self._version is None or version > self._version:
+            self._version = version
+            self._entries.clear()
+
+    def mark_changed(self, db):
+        """Record a data change in the caller's transaction; this process sees it once committed"""
+        bump_version(db, DATA_VERSION_KEY)
+        event.listen(db, "after_commit", lambda session: self.expire(), once=True)
+
+    def expire(self):
+        """Re-read the version on the next request instead of waiting out the poll interval"""
+        self._checked = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def respond(self, request: Request, db, build: Callable[[Response], object],
+                encode: Callable[[object], bytes]) -> Response:
+        """JSON response for `request`, from the cache or from build(response)
+
+        `build` runs the query and may set CACHED_HEADERS on the response it
+        is given; `encode` turns what it returns into JSON bytes.
+        """
+        key = request.url.path + "?" + request.url.query
+        version = self._current_version(db)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            # Read in the same snapshot as the query, so the body is never filed under a newer version
+            built_at = read_version(db, DATA_VERSION_KEY)
+            scratch = Response()
+            data = build(scratch)
+            body = encode(data)
+            etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+            headers = {name: scratch.headers[name] for name in CACHED_HEADERS if name in scratch.headers}
+            entry = (built_at, etag, body, headers)
+            with self._lock:
+                self._observe(built_at)
+                if built_at == self._version:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return self._response(request, entry)
+
+    @staticmethod
+    def _response(request: Request, entry) -> Response:
+        _, etag, body, headers = entry
+        headers = {**headers, "ETag": etag, "Cache-Control": "private, no-cache"}
+        tags = _parse_if_none_match(request.headers.get("if-none-match"))
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _parse_if_none_match(value: Optional[str]) -> set:
+    if not value:
+        return set()
+    # Weak validators are fine for GET revalidation
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,91 @@
+import os
+from datetime import date, datetime
+from sqlalchemy import select, insert, delete, literal, DateTime
+from .models import Subscription, Reminder, ArchivedSubscription, ArchivedReminder
+from .notify_schedule import refresh_subscription_for, refresh_reminder
+from .response_cache import response_cache
+
+# Rows moved per transaction, so the writer lock is never held for long
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+
+
+def _copied_columns(archive_model):
+    return [c.name for c in archive_model.__table__.columns if c.name not in ("id", "item_id", "archived_at")]
+
+
+SUBSCRIPTION_ARCHIVE_COLUMNS = _copied_columns(ArchivedSubscription)
+REMINDER_ARCHIVE_COLUMNS = _copied_columns(ArchivedReminder)
+
+
+def track_disabled(sub):
+    """Keep disabled_at in step with is_disabled"""
+    if not sub.is_disabled:
+        sub.disabled_at = None
+    elif sub.disabled_at is None:
+        sub.disabled_at = datetime.now()
+
+
+def _archive_where(db, live_model, archive_model, columns, condition, batch_size: int) -> int:
+    """Move rows matching condition into the archive table, one committed chunk at a time"""
+    live = live_model.__table__
+    archive = archive_model.__table__
+    moved = 0
+    while True:
+        ids = db.execute(select(live.c.id).where(condition).order_by(live.c.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        db.execute(insert(archive).from_select(
+            ["item_id", "archived_at", *columns],
+            select(live.c.id, literal(datetime.now(), DateTime), *(live.c[name] for name in columns))
+            .where(live.c.id.in_(ids))
+        ))
+        db.execute(delete(live).where(live.c.id.in_(ids)))
+        response_cache.mark_changed(db)
+        db.commit()
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+    return moved
+
+
+def archive_reminders(db, before: date, batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """Archive reminders whose target date is before `before`; sent or not, they can no longer fire"""
+    return _archive_where(db, Reminder, ArchivedReminder, REMINDER_ARCHIVE_COLUMNS,
+                          Reminder.__table__.c.target_date < before, batch_size)
+
+
+def archive_subscriptions(db, disabled_before: datetime, batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """Archive subscriptions that have been disabled since before `disabled_before`"""
+    live = Subscription.__table__
+    return _archive_where(db, Subscription, ArchivedSubscription, SUBSCRIPTION_ARCHIVE_COLUMNS,
+                          (live.c.is_disabled == True) & (live.c.disabled_at <= disabled_before), batch_size)
+
+
+def restore_subscription(db, archived: ArchivedSubscription) -> Subscription:
+    """Move an archived subscription back, keeping its original id when still free"""
+    sub = Subscription(**{name: getattr(archived, name) for name in SUBSCRIPTION_ARCHIVE_COLUMNS})
+    if db.get(Subscription, archived.item_id) is None:
+        sub.id = archived.item_id
+    # Restart the disabled clock so the next retention run does not take it straight back
+    sub.disabled_at = datetime.now() if sub.is_disabled else None
+    refresh_subscription_for(db, sub)
+    db.add(sub)
+    db.delete(archived)
+    response_cache.mark_changed(db)
+    db.commit()
+    db.refresh(sub)
+    return sub
+
+
+def restore_reminder(db, archived: ArchivedReminder) -> Reminder:
+    """Move an archived reminder back, keeping its original id when still free"""
+    reminder = Reminder(**{name: getattr(archived, name) for name in REMINDER_ARCHIVE_COLUMNS})
+    if db.get(Reminder, archived.item_id) is None:
+        reminder.id = archived.item_id
+    refresh_reminder(reminder)
+    db.add(reminder)
+    db.delete(archived)
+    response_cache.mark_changed(db)
+    db.commit()
+    db.refresh(reminder)
+    return reminder
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..database import get_db, get_read_db
+from ..models import ArchivedSubscription, ArchivedReminder
+from ..schemas import (
+    ArchivedSubscriptionResponse, ArchivedReminderResponse, SubscriptionResponse, ReminderResponse
+)
+from ..auth import verify_token
+from ..retention import restore_subscription, restore_reminder
+from ..scheduler import schedule_changed, retention_job
+
+router = APIRouter()
+
+def _page(db, model, group_name, before_id, limit):
+    query = db.query(model)
+    if group_name is not None:
+        query = query.filter(model.group_name == group_name)
+    if before_id is not None:
+        query = query.filter(model.id < before_id)
+    return query.order_by(model.id.desc()).limit(limit).all()
+
+@router.get("/subscriptions", response_model=List[ArchivedSubscriptionResponse])
+def get_archived_subscriptions(
+    group_name: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(verify_token)
+):
+    """Archived subscriptions, most recently archived first; page with before_id"""
+    return _page(db, ArchivedSubscription, group_name, before_id, limit)
+
+@router.get("/reminders", response_model=List[ArchivedReminderResponse])
+def get_archived_reminders(
+    group_name: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(verify_token)
+):
+    """Archived reminders, most recently archived first; page with before_id"""
+    return _page(db, ArchivedReminder, group_name, before_id, limit)
+
+@router.post("/subscriptions/{archive_id}/restore", response_model=SubscriptionResponse)
+def restore_archived_subscription(archive_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Move an archived subscription back into the live table"""
+    archived = db.query(ArchivedSubscription).filter(ArchivedSubscription.id == archive_id).first()
+    if not archived:
+        raise HTTPException(status_code=404, detail="Archived subscription not found")
+    sub = restore_subscription(db, archived)
+    schedule_changed("subscription", sub.id, sub.next_notify_at)
+    return sub
+
+@router.post("/reminders/{archive_id}/restore", response_model=ReminderResponse)
+def restore_archived_reminder(archive_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Move an archived reminder back into the live table"""
+    archived = db.query(ArchivedReminder).filter(ArchivedReminder.id == archive_id).first()
+    if not archived:
+        raise HTTPException(status_code=404, detail="Archived reminder not found")
+    reminder = restore_reminder(db, archived)
+    schedule_changed("reminder", reminder.id, reminder.next_notify_at)
+    return reminder
+
+@router.post("/run")
+def run_retention(current_user: str = Depends(verify_token)):
+    """Apply the retention policy now instead of waiting for the nightly run"""
+    retention_job()
+    return {"message": "Retention policy applied"}
@@ -1,70 +1,72 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime
 import json
-from ..database import get_db
-from ..models import Settings, Subscription, Reminder
+from ..database import get_db, get_read_db
+from ..models import Settings, Subscription, Reminder, ArchivedSubscription, ArchivedReminder
+from ..settings_store import settings_cache
+from ..response_cache import response_cache
 from ..schemas import BackupData
 from ..auth import verify_token
+from ..notify_schedule import rebuild_notify_schedule, dump_notify_days
+from ..scheduler import reschedule_all
+from ..serialization import FastJSONResponse, rows_to_dicts
 
 router = APIRouter()
 
+# Backup fields, in the order they have always been written
+SUBSCRIPTION_EXPORT_FIELDS = (
+    "id", "name", "price", "cycle_val", "cycle_unit", "next_date", "notify_mode", "cust_days", "cust_time",
+    "last_sent", "group_name", "is_disabled", "remarks", "notify_email", "notify_wechat", "notify_webhook", "notify_resend"
+)
+REMINDER_EXPORT_FIELDS = (
+    "id", "title", "content", "target_date", "target_time", "is_sent", "group_name", "is_disabled",
+    "notify_email", "notify_wechat", "notify_webhook", "notify_resend"
+)
+SUBSCRIPTION_EXPORT_COLUMNS = [Subscription.__table__.c[name] for name in SUBSCRIPTION_EXPORT_FIELDS]
+REMINDER_EXPORT_COLUMNS = [Reminder.__table__.c[name] for name in REMINDER_EXPORT_FIELDS]
+# Archive tables go into the backup whole, minus their own row ids
+ARCHIVE_MODELS = {"subscriptions_archive": ArchivedSubscription, "reminders_archive": ArchivedReminder}
+ARCHIVE_EXPORT_COLUMNS = {
+    key: [column for column in model.__table__.columns if column.name != "id"]
+    for key, model in ARCHIVE_MODELS.items()
+}
+
+def _archive_row(model, data: dict) -> dict:
+    """Columns of one backed-up archive row, with dates parsed back from isoformat"""
+    table = model.__table__
+    values = {}
+    for name, value in data.items():
+        if name == "id" or name not in table.c:
+            continue
+        if value and isinstance(table.c[name].type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value and isinstance(table.c[name].type, Date):
+            value = date.fromisoformat(value)
+        values[name] = value
+    return values
+
 @router.get("/export")
-async def export_data(db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def export_data(db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)):
     """Export all data as JSON"""
     try:
         # Get all settings
         settings_dict = {}
         all_settings = db.query(Settings).all()
         for setting in all_settings:
-            if setting.key in ['smtp_conf', 'wechat_conf', 'global_days']:
+            if setting.key in ['smtp_conf', 'wechat_conf', 'global_days', 'digest_conf', 'retention_conf']:
                 settings_dict[setting.key] = json.loads(setting.value)
             else:
                 settings_dict[setting.key] = setting.value
         
-        # Get all subscriptions
-        subscriptions = []
-        for sub in db.query(Subscription).all():
-            sub_dict = {
-                "id": sub.id,
-                "name": sub.name,
-                "price": sub.price,
-                "cycle_val": sub.cycle_val,
-                "cycle_unit": sub.cycle_unit,
-                "next_date": sub.next_date.isoformat(),
-                "notify_mode": sub.notify_mode,
-                "cust_days": sub.cust_days,
-                "cust_time": sub.cust_time,
-                "last_sent": sub.last_sent.isoformat() if sub.last_sent else None,
-                "group_name": sub.group_name,
-                "is_disabled": sub.is_disabled,
-                "remarks": sub.remarks,
-                "notify_email": sub.notify_email,
-                "notify_wechat": sub.notify_wechat,
-                "notify_webhook": sub.notify_webhook,
-                "notify_resend": sub.notify_resend
-            }
-            subscriptions.append(sub_dict)
-        
-        # Get all reminders
-        reminders = []
-        for reminder in db.query(Reminder).all():
-            reminder_dict = {
-                "id": reminder.id,
-                "title": reminder.title,
-                "content": reminder.content,
-                "target_date": reminder.target_date.isoformat(),
-                "target_time": reminder.target_time,
-                "is_sent": reminder.is_sent,
-                "group_name": reminder.group_name,
-                "is_disabled": reminder.is_disabled,
-                "notify_email": reminder.notify_email,
-                "notify_wechat": reminder.notify_wechat,
-                "notify_webhook": reminder.notify_webhook,
-                "notify_resend": reminder.notify_resend
-            }
-            reminders.append(reminder_dict)
+        # Rows are read as tuples and encoded by orjson; no ORM objects or per-row dicts by hand
+        subscriptions = rows_to_dicts(db.query(*SUBSCRIPTION_EXPORT_COLUMNS).all(), SUBSCRIPTION_EXPORT_FIELDS)
+        reminders = rows_to_dicts(db.query(*REMINDER_EXPORT_COLUMNS).all(), REMINDER_EXPORT_FIELDS)
+        archives = {
+            key: rows_to_dicts(db.query(*columns).all(), [column.name for column in columns])
+            for key, columns in ARCHIVE_EXPORT_COLUMNS.items()
+        }
         
         # Create backup data
         backup = {
@@ -74,32 +76,38 @@ async def export_data(db: Session = Depends(get_db), current_user: str = Depends
             },
             "settings": settings_dict,
             "subscriptions": subscriptions,
-            "reminders": reminders
+            "reminders": reminders,
+            **archives
         }
         
-        return JSONResponse(content=backup)
+        return FastJSONResponse(content=backup)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/import")
-async def import_data(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def import_data(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Import data from JSON backup"""
     try:
         # Read and parse JSON
-        content = await file.read()
+        content = file.file.read()
         backup_data = json.loads(content)
         
         # Clear existing data
         db.query(Settings).delete()
         db.query(Subscription).delete()
         db.query(Reminder).delete()
+        for model in ARCHIVE_MODELS.values():
+            db.query(model).delete()
+        response_cache.mark_changed(db)
         db.commit()
         
         # Import settings
         if "settings" in backup_data:
             for key, value in backup_data["settings"].items():
-                if isinstance(value, (dict, list)):
+                if key == "global_days":
+                    value_str = dump_notify_days(value)
+                elif isinstance(value, (dict, list)):
                     value_str = json.dumps(value)
                 else:
                     value_str = str(value)
@@ -113,6 +121,8 @@ async def import_data(file: UploadFile = File(...), db: Session = Depends(get_db
                     del sub_data_copy["id"]
                 if "next_date" in sub_data_copy:
                     sub_data_copy["next_date"] = datetime.fromisoformat(sub_data_copy["next_date"]).date()
+                if sub_data_copy.get("cust_days") is not None:
+                    sub_data_copy["cust_days"] = dump_notify_days(sub_data_copy["cust_days"])
                 if "last_sent" in sub_data_copy and sub_data_copy["last_sent"]:
                     sub_data_copy["last_sent"] = datetime.fromisoformat(sub_data_copy["last_sent"])
                 db.add(Subscription(**sub_data_copy))
@@ -129,8 +139,19 @@ async def import_data(file: UploadFile = File(...), db: Session = Depends(get_db
                     reminder_data_copy["content"] = reminder_data_copy["content"]
                 db.add(Reminder(**reminder_data_copy))
         
+        # Import archived rows; backups from before retention have none
+        for key, model in ARCHIVE_MODELS.items():
+            for archived_data in backup_data.get(key, []):
+                db.add(model(**_archive_row(model, archived_data)))
+        
+        settings_cache.invalidate(db)
+        response_cache.mark_changed(db)
         db.commit()
         
+        # Backups don't carry the precomputed schedule, so derive it now
+        rebuild_notify_schedule(db)
+        reschedule_all()
+        
         return {"message": "Data imported successfully"}
     
     except Exception as e:
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, Optional
+from ..database import get_db, get_read_db
+from ..auth import verify_token
+from ..resilience import channel_guards
+from ..channel_state import read_channel_state, request_channel_reset
+from ..delivery_log import query_delivery_log, delivery_stats
+from ..schemas import DeliveryLogPage
+
+router = APIRouter()
+
+@router.get("/channels")
+def get_channel_status(db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)) -> Dict:
+    """Circuit breaker and rate limiter state of each channel, as last published by the scheduler leader"""
+    return read_channel_state(db)
+
+@router.post("/channels/{channel}/reset")
+def reset_channel(channel: str, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Close a channel's circuit; the scheduler leader applies it within CHANNEL_STATE_SECONDS"""
+    if channel not in channel_guards:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    return request_channel_reset(db, channel)
+
+@router.get("/log", response_model=DeliveryLogPage)
+def get_delivery_log(
+    item_type: Optional[str] = None,
+    item_id: Optional[int] = None,
+    channel: Optional[str] = None,
+    outcome: Optional[str] = None,
+    since: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(verify_token)
+):
+    """Delivery attempts, newest first; pass next_before_id back as before_id for the next page"""
+    items = query_delivery_log(db, item_type, item_id, channel, outcome, since, before_id, limit)
+    return {"items": items, "next_before_id": items[-1].id if len(items) == limit else None}
+
+@router.get("/stats")
+def get_delivery_stats(
+    hours: float = Query(24, gt=0, le=24 * 365),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(verify_token)
+) -> Dict:
+    """Per-channel failure rate and p50/p95 latency over the last `hours`"""
+    return delivery_stats(db, hours)
@@ -1,27 +1,150 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from datetime import date, datetime
+from typing import List, Optional
+from ..database import get_db, get_read_db
 from ..models import Reminder
-from ..schemas import ReminderCreate, ReminderUpdate, ReminderResponse
+from ..schemas import (
+    ReminderCreate, ReminderUpdate, ReminderResponse, ReminderFilter,
+    ReminderBulkCreate, ReminderBulkUpdate, ReminderBulkPatch, ReminderBulkDelete, BulkResult
+)
 from ..auth import verify_token
+from ..notify_schedule import refresh_reminder
+from ..scheduler import schedule_changed, reschedule_all
+from ..pagination import paginate, prefix_filter
+from ..response_cache import response_cache
+from ..serialization import response_columns, column_encoder, dumps
+from ..bulk import selection, bulk_result, id_outcomes, patch_rows, delete_rows
 
 router = APIRouter()
 
+# The list is read as plain tuples and encoded without per-row model validation
+LIST_COLUMNS = response_columns(Reminder, ReminderResponse)
+encode_list = column_encoder(LIST_COLUMNS)
+
+SORT_COLUMNS = {
+    "id": Reminder.id,
+    "title": Reminder.title,
+    "target_date": Reminder.target_date,
+}
+
+def reminder_conditions(f: Optional[ReminderFilter]) -> list:
+    """WHERE clauses shared by the list endpoint and bulk requests"""
+    if f is None:
+        return []
+    conditions = []
+    if f.group_name is not None:
+        conditions.append(Reminder.group_name == f.group_name)
+    if f.is_disabled is not None:
+        conditions.append(Reminder.is_disabled == f.is_disabled)
+    if f.is_sent is not None:
+        conditions.append(Reminder.is_sent == f.is_sent)
+    if f.target_date_from is not None:
+        conditions.append(Reminder.target_date >= f.target_date_from)
+    if f.target_date_to is not None:
+        conditions.append(Reminder.target_date <= f.target_date_to)
+    if f.title_prefix:
+        conditions.append(prefix_filter(Reminder.title, f.title_prefix))
+    return conditions
+
 @router.get("/", response_model=List[ReminderResponse])
-async def get_reminders(db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
-    """Get all reminders"""
-    return db.query(Reminder).all()
+def get_reminders(
+    request: Request,
+    group_name: Optional[str] = None,
+    is_disabled: Optional[bool] = None,
+    is_sent: Optional[bool] = None,
+    target_date_from: Optional[date] = None,
+    target_date_to: Optional[date] = None,
+    title_prefix: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(verify_token)
+):
+    """Get reminders, optionally filtered, sorted and paged (next page cursor in X-Next-Cursor)"""
+    query = db.query(*LIST_COLUMNS).filter(*reminder_conditions(ReminderFilter(
+        group_name=group_name, is_disabled=is_disabled, is_sent=is_sent,
+        target_date_from=target_date_from, target_date_to=target_date_to, title_prefix=title_prefix
+    )))
+    return response_cache.respond(
+        request, db,
+        lambda response: paginate(query, Reminder, SORT_COLUMNS, sort, order, cursor, limit, response, include_total),
+        encode_list
+    )
 
 
 @router.get("/groups", response_model=List[str])
-async def get_reminder_groups(db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def get_reminder_groups(request: Request, db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)):
     """Get all unique reminder groups"""
-    groups = db.query(Reminder.group_name).distinct().all()
-    return [group[0] for group in groups if group[0] is not None]
+    def build(response):
+        groups = db.query(Reminder.group_name).distinct().all()
+        return [group[0] for group in groups if group[0] is not None]
+    return response_cache.respond(request, db, build, dumps)
+
+@router.post("/bulk", response_model=BulkResult)
+def bulk_create_reminders(body: ReminderBulkCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Create many reminders in one transaction"""
+    now = datetime.now()
+    reminders = []
+    for item in body.items:
+        db_reminder = Reminder(**item.dict())
+        refresh_reminder(db_reminder, now)
+        reminders.append(db_reminder)
+    db.add_all(reminders)
+    db.flush()
+    results = [{"index": index, "id": db_reminder.id, "status": "created"} for index, db_reminder in enumerate(reminders)]
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(results)
+
+@router.put("/bulk", response_model=BulkResult)
+def bulk_update_reminders(body: ReminderBulkUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Update many reminders, each with its own values, in one transaction"""
+    now = datetime.now()
+    ids = {item.id for item in body.items}
+    reminders = {db_reminder.id: db_reminder for db_reminder in db.query(Reminder).filter(Reminder.id.in_(ids))}
+    results = []
+    for index, item in enumerate(body.items):
+        db_reminder = reminders.get(item.id)
+        if db_reminder is None:
+            results.append({"index": index, "id": item.id, "status": "not_found"})
+            continue
+        for field, value in item.dict(exclude_unset=True, exclude={"id"}).items():
+            setattr(db_reminder, field, value)
+        refresh_reminder(db_reminder, now)
+        results.append({"index": index, "id": item.id, "status": "updated"})
+    # The flush groups rows with the same changed columns into executemany UPDATEs
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(results)
+
+@router.patch("/bulk", response_model=BulkResult)
+def bulk_patch_reminders(body: ReminderBulkPatch, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Apply the same changes to the reminders picked by ids and/or filter"""
+    clauses = selection(Reminder, body.ids, reminder_conditions(body.filter))
+    updated = patch_rows(db, Reminder, clauses, body.changes.dict(exclude_unset=True), datetime.now())
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(id_outcomes(body.ids, updated, "updated"))
+
+@router.delete("/bulk", response_model=BulkResult)
+def bulk_delete_reminders(body: ReminderBulkDelete, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Delete the reminders picked by ids and/or filter"""
+    clauses = selection(Reminder, body.ids, reminder_conditions(body.filter))
+    deleted = delete_rows(db, Reminder, clauses)
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(id_outcomes(body.ids, deleted, "deleted"))
 
 @router.get("/{reminder_id}", response_model=ReminderResponse)
-async def get_reminder(reminder_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def get_reminder(reminder_id: int, db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)):
     """Get a specific reminder"""
     reminder = db.query(Reminder).filter(Reminder.id == reminder_id).first()
     if not reminder:
@@ -29,16 +152,19 @@ async def get_reminder(reminder_id: int, db: Session = Depends(get_db), current_
     return reminder
 
 @router.post("/", response_model=ReminderResponse)
-async def create_reminder(reminder: ReminderCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def create_reminder(reminder: ReminderCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Create a new reminder"""
     db_reminder = Reminder(**reminder.dict())
+    refresh_reminder(db_reminder)
     db.add(db_reminder)
+    response_cache.mark_changed(db)
     db.commit()
     db.refresh(db_reminder)
+    schedule_changed("reminder", db_reminder.id, db_reminder.next_notify_at)
     return db_reminder
 
 @router.put("/{reminder_id}", response_model=ReminderResponse)
-async def update_reminder(reminder_id: int, reminder: ReminderUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def update_reminder(reminder_id: int, reminder: ReminderUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Update a reminder"""
     db_reminder = db.query(Reminder).filter(Reminder.id == reminder_id).first()
     if not db_reminder:
@@ -49,17 +175,22 @@ async def update_reminder(reminder_id: int, reminder: ReminderUpdate, db: Sessio
     for field, value in update_data.items():
         setattr(db_reminder, field, value)
     
+    refresh_reminder(db_reminder)
+    response_cache.mark_changed(db)
     db.commit()
     db.refresh(db_reminder)
+    schedule_changed("reminder", db_reminder.id, db_reminder.next_notify_at)
     return db_reminder
 
 @router.delete("/{reminder_id}")
-async def delete_reminder(reminder_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def delete_reminder(reminder_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Delete a reminder"""
     db_reminder = db.query(Reminder).filter(Reminder.id == reminder_id).first()
     if not db_reminder:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
     db.delete(db_reminder)
+    response_cache.mark_changed(db)
     db.commit()
+    schedule_changed("reminder", reminder_id, None)
     return {"message": "Reminder deleted successfully"}
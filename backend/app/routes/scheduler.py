@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Dict
+from ..database import get_read_db
+from ..auth import verify_token
+from ..scheduler import scheduler_status
+
+router = APIRouter()
+
+@router.get("/status")
+def get_scheduler_status(db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)) -> Dict:
+    """Job run history, dispatch lag and how far behind notifications are"""
+    return scheduler_status(db)
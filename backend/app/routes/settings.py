@@ -1,105 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 import json
 from typing import Dict
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import Settings
+from ..schemas import DigestConf, RetentionConf
 from ..auth import verify_token
 from ..notifier import Notifier
+from ..resilience import test_channel_guards
+from ..settings_store import settings_cache
+from ..response_cache import response_cache
+from ..serialization import dumps
+from ..notify_schedule import rebuild_notify_schedule, dump_notify_days
+from ..scheduler import reschedule_all
 
 router = APIRouter()
 
+# Stored form of each editable setting
+SETTING_ENCODERS = {
+    "smtp_conf": json.dumps,
+    "wechat_conf": json.dumps,
+    "webhook_conf": json.dumps,
+    "resend_conf": json.dumps,
+    "global_days": dump_notify_days,
+    "global_time": str,
+    "digest_conf": json.dumps,
+    "retention_conf": json.dumps,
+}
+# Settings whose shape is checked before they are stored; the scheduler and
+# every settings read rely on it
+SETTING_MODELS = {
+    "digest_conf": DigestConf,
+    "retention_conf": RetentionConf,
+}
+
 @router.get("/")
-async def get_settings(db: Session = Depends(get_db), current_user: str = Depends(verify_token)) -> Dict:
+def get_settings(request: Request, db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)) -> Dict:
     """Get all settings"""
-    settings_dict = {}
-    
-    # Get SMTP config
-    smtp = db.query(Settings).filter(Settings.key == "smtp_conf").first()
-    settings_dict["smtp_conf"] = json.loads(smtp.value) if smtp else None
-    
-    # Get WeChat config
-    wechat = db.query(Settings).filter(Settings.key == "wechat_conf").first()
-    settings_dict["wechat_conf"] = json.loads(wechat.value) if wechat else None
-    
-    # Get Webhook config
-    webhook = db.query(Settings).filter(Settings.key == "webhook_conf").first()
-    settings_dict["webhook_conf"] = json.loads(webhook.value) if webhook and webhook.value else {"webhook_key": ""}
-    
-    # Get Resend config
-    resend = db.query(Settings).filter(Settings.key == "resend_conf").first()
-    settings_dict["resend_conf"] = json.loads(resend.value) if resend else None
-    
-    # Get global days
-    global_days = db.query(Settings).filter(Settings.key == "global_days").first()
-    settings_dict["global_days"] = json.loads(global_days.value) if global_days else [3, 1, 0]
-    
-    # Get global time
-    global_time = db.query(Settings).filter(Settings.key == "global_time").first()
-    settings_dict["global_time"] = global_time.value if global_time else "09:00"
-    
-    return settings_dict
+    def build(response):
+        # The body is filed under the data version read just before build; settings
+        # polled earlier than that could be older, so re-check them now
+        settings = settings_cache.get(db, force=True)
+        settings_dict = {key: settings[key] for key in SETTING_ENCODERS}
+        settings_dict["global_days"] = list(settings["global_days"])
+        return settings_dict
+    return response_cache.respond(request, db, build, dumps)
 
 @router.put("/")
-async def update_settings(settings: Dict, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def update_settings(settings: Dict, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Update settings"""
+    for key, model in SETTING_MODELS.items():
+        if key in settings:
+            try:
+                settings[key] = model.model_validate(settings[key]).model_dump()
+            except ValidationError as e:
+                raise RequestValidationError([{**error, "loc": ("body", key, *error["loc"])} for error in e.errors()])
     try:
-        # Update SMTP config
-        if "smtp_conf" in settings:
-            smtp = db.query(Settings).filter(Settings.key == "smtp_conf").first()
-            if smtp:
-                smtp.value = json.dumps(settings["smtp_conf"])
-            else:
-                db.add(Settings(key="smtp_conf", value=json.dumps(settings["smtp_conf"])))
-        
-        # Update WeChat config
-        if "wechat_conf" in settings:
-            wechat = db.query(Settings).filter(Settings.key == "wechat_conf").first()
-            if wechat:
-                wechat.value = json.dumps(settings["wechat_conf"])
+        keys = [key for key in SETTING_ENCODERS if key in settings]
+        existing = {row.key: row for row in db.query(Settings).filter(Settings.key.in_(keys)).all()}
+        for key in keys:
+            value = SETTING_ENCODERS[key](settings[key])
+            if key in existing:
+                existing[key].value = value
             else:
-                db.add(Settings(key="wechat_conf", value=json.dumps(settings["wechat_conf"])))
+                db.add(Settings(key=key, value=value))
         
-        # Update Webhook config
-        if "webhook_conf" in settings:
-            webhook = db.query(Settings).filter(Settings.key == "webhook_conf").first()
-            if webhook:
-                webhook.value = json.dumps(settings["webhook_conf"])
-            else:
-                db.add(Settings(key="webhook_conf", value=json.dumps(settings["webhook_conf"])))
-        
-        # Update Resend config
-        if "resend_conf" in settings:
-            resend = db.query(Settings).filter(Settings.key == "resend_conf").first()
-            if resend:
-                resend.value = json.dumps(settings["resend_conf"])
-            else:
-                db.add(Settings(key="resend_conf", value=json.dumps(settings["resend_conf"])))
+        settings_cache.invalidate(db)
+        response_cache.mark_changed(db)
+        db.commit()
         
-        # Update global days
-        if "global_days" in settings:
-            global_days = db.query(Settings).filter(Settings.key == "global_days").first()
-            if global_days:
-                global_days.value = json.dumps(settings["global_days"])
-            else:
-                db.add(Settings(key="global_days", value=json.dumps(settings["global_days"])))
+        # Global-mode subscriptions follow these settings, so reschedule them
+        if "global_days" in settings or "global_time" in settings:
+            rebuild_notify_schedule(db, only_global=True)
+            reschedule_all()
         
-        # Update global time
-        if "global_time" in settings:
-            global_time = db.query(Settings).filter(Settings.key == "global_time").first()
-            if global_time:
-                global_time.value = settings["global_time"]
-            else:
-                db.add(Settings(key="global_time", value=settings["global_time"]))
-        
-        db.commit()
         return {"message": "Settings updated successfully"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/test/{notification_type}")
-async def test_notification(
+def test_notification(
     notification_type: str, 
     config: Dict = None,
     db: Session = Depends(get_db), 
@@ -115,7 +98,7 @@ async def test_notification(
         if notification_type == "smtp":
             if config and config.get('host'):
                 # Create temporary notifier with provided config
-                temp_notifier = Notifier(db)
+                temp_notifier = Notifier(db, guards=test_channel_guards)
                 temp_notifier.smtp_config = config
                 success = temp_notifier.send_email(test_title, test_content)
                 if success:
@@ -127,7 +110,7 @@ async def test_notification(
                 
         elif notification_type == "wechat":
             if config and config.get('corpid'):
-                temp_notifier = Notifier(db)
+                temp_notifier = Notifier(db, guards=test_channel_guards)
                 temp_notifier.wechat_config = config
                 success = temp_notifier.send_wechat(test_title, test_content)
                 if success:
@@ -139,7 +122,7 @@ async def test_notification(
                 
         elif notification_type == "webhook":
             if config and config.get('webhook_key'):
-                temp_notifier = Notifier(db)
+                temp_notifier = Notifier(db, guards=test_channel_guards)
                 temp_notifier.webhook_config = config
                 temp_notifier.send_webhook_notification(test_title, test_content)
                 result = {"success": True, "message": "企业微信 Webhook 测试成功"}
@@ -148,7 +131,7 @@ async def test_notification(
                 
         elif notification_type == "resend":
             if config and config.get('api_key'):
-                temp_notifier = Notifier(db)
+                temp_notifier = Notifier(db, guards=test_channel_guards)
                 temp_notifier.resend_config = config
                 success = temp_notifier.send_resend(test_title, test_content)
                 if success:
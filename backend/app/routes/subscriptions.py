@@ -1,28 +1,164 @@
-import json
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from datetime import date, datetime
+from typing import List, Optional
+from ..database import get_db, get_read_db
 from ..models import Subscription
-from ..schemas import SubscriptionCreate, SubscriptionUpdate, SubscriptionResponse
+from ..schemas import (
+    SubscriptionCreate, SubscriptionUpdate, SubscriptionResponse, SubscriptionFilter,
+    SubscriptionBulkCreate, SubscriptionBulkUpdate, SubscriptionBulkPatch, SubscriptionBulkDelete, BulkResult
+)
 from ..auth import verify_token
+from ..notify_schedule import (
+    refresh_subscription_for, refresh_subscription, load_global_notify_settings, dump_notify_days
+)
+from ..scheduler import schedule_changed, reschedule_all
+from ..cycles import add_cycles
+from ..retention import track_disabled
+from ..pagination import paginate, prefix_filter
+from ..response_cache import response_cache
+from ..serialization import response_columns, column_encoder, dumps
+from ..bulk import selection, bulk_result, id_outcomes, patch_rows, delete_rows
 
 router = APIRouter()
 
+# The list is read as plain tuples and encoded without per-row model validation
+LIST_COLUMNS = response_columns(Subscription, SubscriptionResponse)
+encode_list = column_encoder(LIST_COLUMNS)
+
+SORT_COLUMNS = {
+    "id": Subscription.id,
+    "name": Subscription.name,
+    "next_date": Subscription.next_date,
+    "price": Subscription.price,
+}
+
+def subscription_conditions(f: Optional[SubscriptionFilter]) -> list:
+    """WHERE clauses shared by the list endpoint and bulk requests"""
+    if f is None:
+        return []
+    conditions = []
+    if f.group_name is not None:
+        conditions.append(Subscription.group_name == f.group_name)
+    if f.is_disabled is not None:
+        conditions.append(Subscription.is_disabled == f.is_disabled)
+    if f.next_date_from is not None:
+        conditions.append(Subscription.next_date >= f.next_date_from)
+    if f.next_date_to is not None:
+        conditions.append(Subscription.next_date <= f.next_date_to)
+    if f.name_prefix:
+        conditions.append(prefix_filter(Subscription.name, f.name_prefix))
+    return conditions
+
 @router.get("/", response_model=List[SubscriptionResponse])
-async def get_subscriptions(db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
-    """Get all subscriptions"""
-    return db.query(Subscription).all()
+def get_subscriptions(
+    request: Request,
+    group_name: Optional[str] = None,
+    is_disabled: Optional[bool] = None,
+    next_date_from: Optional[date] = None,
+    next_date_to: Optional[date] = None,
+    name_prefix: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(verify_token)
+):
+    """Get subscriptions, optionally filtered, sorted and paged (next page cursor in X-Next-Cursor)"""
+    query = db.query(*LIST_COLUMNS).filter(*subscription_conditions(SubscriptionFilter(
+        group_name=group_name, is_disabled=is_disabled,
+        next_date_from=next_date_from, next_date_to=next_date_to, name_prefix=name_prefix
+    )))
+    return response_cache.respond(
+        request, db,
+        lambda response: paginate(query, Subscription, SORT_COLUMNS, sort, order, cursor, limit, response, include_total),
+        encode_list
+    )
 
 
 @router.get("/groups", response_model=List[str])
-async def get_subscription_groups(db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def get_subscription_groups(request: Request, db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)):
     """Get all unique subscription groups"""
-    groups = db.query(Subscription.group_name).distinct().all()
-    return [group[0] for group in groups if group[0] is not None]
+    def build(response):
+        groups = db.query(Subscription.group_name).distinct().all()
+        return [group[0] for group in groups if group[0] is not None]
+    return response_cache.respond(request, db, build, dumps)
+
+@router.post("/bulk", response_model=BulkResult)
+def bulk_create_subscriptions(body: SubscriptionBulkCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Create many subscriptions in one transaction"""
+    now = datetime.now()
+    global_days, global_time = load_global_notify_settings(db)
+    subs = []
+    for item in body.items:
+        subscription_dict = item.dict()
+        subscription_dict['cust_days'] = process_cust_days(subscription_dict.get('cust_days'))
+        db_sub = Subscription(**subscription_dict)
+        track_disabled(db_sub)
+        refresh_subscription(db_sub, global_days, global_time, now)
+        subs.append(db_sub)
+    db.add_all(subs)
+    db.flush()
+    results = [{"index": index, "id": db_sub.id, "status": "created"} for index, db_sub in enumerate(subs)]
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(results)
+
+@router.put("/bulk", response_model=BulkResult)
+def bulk_update_subscriptions(body: SubscriptionBulkUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Update many subscriptions, each with its own values, in one transaction"""
+    now = datetime.now()
+    global_days, global_time = load_global_notify_settings(db)
+    ids = {item.id for item in body.items}
+    subs = {db_sub.id: db_sub for db_sub in db.query(Subscription).filter(Subscription.id.in_(ids))}
+    results = []
+    for index, item in enumerate(body.items):
+        db_sub = subs.get(item.id)
+        if db_sub is None:
+            results.append({"index": index, "id": item.id, "status": "not_found"})
+            continue
+        update_data = item.dict(exclude_unset=True, exclude={"id"})
+        if 'cust_days' in update_data:
+            update_data['cust_days'] = process_cust_days(update_data['cust_days'])
+        for field, value in update_data.items():
+            setattr(db_sub, field, value)
+        track_disabled(db_sub)
+        refresh_subscription(db_sub, global_days, global_time, now)
+        results.append({"index": index, "id": item.id, "status": "updated"})
+    # The flush groups rows with the same changed columns into executemany UPDATEs
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(results)
+
+@router.patch("/bulk", response_model=BulkResult)
+def bulk_patch_subscriptions(body: SubscriptionBulkPatch, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Apply the same changes to the subscriptions picked by ids and/or filter"""
+    changes = body.changes.dict(exclude_unset=True)
+    if 'cust_days' in changes:
+        changes['cust_days'] = process_cust_days(changes['cust_days'])
+    clauses = selection(Subscription, body.ids, subscription_conditions(body.filter))
+    updated = patch_rows(db, Subscription, clauses, changes, datetime.now())
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(id_outcomes(body.ids, updated, "updated"))
+
+@router.delete("/bulk", response_model=BulkResult)
+def bulk_delete_subscriptions(body: SubscriptionBulkDelete, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """Delete the subscriptions picked by ids and/or filter"""
+    clauses = selection(Subscription, body.ids, subscription_conditions(body.filter))
+    deleted = delete_rows(db, Subscription, clauses)
+    response_cache.mark_changed(db)
+    db.commit()
+    reschedule_all()
+    return bulk_result(id_outcomes(body.ids, deleted, "deleted"))
 
 @router.get("/{subscription_id}", response_model=SubscriptionResponse)
-async def get_subscription(subscription_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def get_subscription(subscription_id: int, db: Session = Depends(get_read_db), current_user: str = Depends(verify_token)):
     """Get a specific subscription"""
     sub = db.query(Subscription).filter(Subscription.id == subscription_id).first()
     if not sub:
@@ -30,55 +166,30 @@ async def get_subscription(subscription_id: int, db: Session = Depends(get_db),
     return sub
 
 def process_cust_days(cust_days):
-    """Process and convert cust_days to proper JSON string format"""
+    """Normalize cust_days to its canonical JSON array form"""
     if cust_days is None:
         return None
-    
-    if isinstance(cust_days, list):
-        # If it's already a list, convert to JSON string
-        return json.dumps(cust_days)
-    elif isinstance(cust_days, str):
-        # If it's a string, try to parse as JSON first
-        try:
-            parsed = json.loads(cust_days)
-            if isinstance(parsed, list):
-                return cust_days  # Already proper JSON
-            else:
-                # If parsed JSON is not a list, handle as comma-separated string
-                if ',' in cust_days:
-                    days_str = cust_days.split(',')
-                    days_list = [int(day.strip()) for day in days_str if day.strip().lstrip('-').isdigit()]
-                    return json.dumps(days_list)
-                else:
-                    return json.dumps([])  # Return empty array if not valid
-        except json.JSONDecodeError:
-            # If not valid JSON, handle as comma-separated string
-            if ',' in cust_days:
-                days_str = cust_days.split(',')
-                days_list = [int(day.strip()) for day in days_str if day.strip().lstrip('-').isdigit()]
-                return json.dumps(days_list)
-            elif cust_days.strip().lstrip('-').isdigit():
-                return json.dumps([int(cust_days.strip())])
-            else:
-                return json.dumps([])  # Return empty array if not valid
-    else:
-        return json.dumps([])  # Return empty array if not valid type
+    return dump_notify_days(cust_days)
 
 @router.post("/", response_model=SubscriptionResponse)
-async def create_subscription(subscription: SubscriptionCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def create_subscription(subscription: SubscriptionCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Create a new subscription"""
     # Process cust_days to ensure proper JSON format
     subscription_dict = subscription.dict()
     subscription_dict['cust_days'] = process_cust_days(subscription_dict.get('cust_days'))
     
     db_sub = Subscription(**subscription_dict)
+    track_disabled(db_sub)
+    refresh_subscription_for(db, db_sub)
     db.add(db_sub)
+    response_cache.mark_changed(db)
     db.commit()
     db.refresh(db_sub)
+    schedule_changed("subscription", db_sub.id, db_sub.next_notify_at)
     return db_sub
 
 @router.put("/{subscription_id}", response_model=SubscriptionResponse)
-async def update_subscription(subscription_id: int, subscription: SubscriptionUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def update_subscription(subscription_id: int, subscription: SubscriptionUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Update a subscription"""
     db_sub = db.query(Subscription).filter(Subscription.id == subscription_id).first()
     if not db_sub:
@@ -93,44 +204,43 @@ async def update_subscription(subscription_id: int, subscription: SubscriptionUp
     for field, value in update_data.items():
         setattr(db_sub, field, value)
     
+    track_disabled(db_sub)
+    refresh_subscription_for(db, db_sub)
+    response_cache.mark_changed(db)
     db.commit()
     db.refresh(db_sub)
+    schedule_changed("subscription", db_sub.id, db_sub.next_notify_at)
     return db_sub
 
 @router.delete("/{subscription_id}")
-async def delete_subscription(subscription_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def delete_subscription(subscription_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Delete a subscription"""
     db_sub = db.query(Subscription).filter(Subscription.id == subscription_id).first()
     if not db_sub:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
     db.delete(db_sub)
+    response_cache.mark_changed(db)
     db.commit()
+    schedule_changed("subscription", subscription_id, None)
     return {"message": "Subscription deleted successfully"}
 
 @router.post("/{subscription_id}/renew")
-async def renew_subscription(subscription_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+def renew_subscription(subscription_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """Manually trigger next billing cycle for a subscription"""
     db_sub = db.query(Subscription).filter(Subscription.id == subscription_id).first()
     if not db_sub:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
     # Calculate next date based on cycle
-    from datetime import timedelta
-    from dateutil.relativedelta import relativedelta
-    
-    if db_sub.cycle_unit == 'day':
-        db_sub.next_date = db_sub.next_date + timedelta(days=db_sub.cycle_val)
-    elif db_sub.cycle_unit == 'week':
-        db_sub.next_date = db_sub.next_date + timedelta(weeks=db_sub.cycle_val)
-    elif db_sub.cycle_unit == 'month':
-        db_sub.next_date = db_sub.next_date + relativedelta(months=db_sub.cycle_val)
-    elif db_sub.cycle_unit == 'year':
-        db_sub.next_date = db_sub.next_date + relativedelta(years=db_sub.cycle_val)
+    db_sub.next_date = add_cycles(db_sub.next_date, db_sub.cycle_val, db_sub.cycle_unit)
     
     # Reset last_sent to allow notifications for the new cycle
     db_sub.last_sent = None
+    refresh_subscription_for(db, db_sub)
     
+    response_cache.mark_changed(db)
     db.commit()
     db.refresh(db_sub)
+    schedule_changed("subscription", db_sub.id, db_sub.next_notify_at)
     return db_sub
@@ -1,196 +1,461 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime, date, timedelta
-from dateutil.relativedelta import relativedelta
-import json
-from .database import SessionLocal
-from .models import Settings, Subscription, Reminder
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+from datetime import datetime, time, timedelta
+from sqlalchemy import update, bindparam
+from .database import SessionLocal, DB_PATH
+from .models import Subscription, Reminder, JobRun
 from .notifier import Notifier
+from .notify_schedule import (
+    load_global_notify_settings, refresh_subscription, refresh_reminder,
+    subscription_notify_rule, next_subscription_fire
+)
+from .cycles import advance_to
+from .fire_queue import FireEngine
+from .leader import LeaderLease
+from .delivery import delivery_queue
+from .smtp_pool import smtp_pool
+from .transport import transport
+from .delivery_log import delivery_log
+from .settings_store import settings_cache, read_version
+from .response_cache import response_cache, DATA_VERSION_KEY
+from .retention import archive_reminders, archive_subscriptions
+from .channel_state import sync_channel_state, CHANNEL_STATE_SECONDS
+from .outbox import (
+    add_messages, add_digest_messages, load_digest_conf, uses_digest, new_claim_token,
+    deliver, outbox_retry_job, outbox_counts, OUTBOX_BATCH_SIZE
+)
+import os
+import signal
+import threading
 import traceback
 
-scheduler = BackgroundScheduler()
+# 'cron' polls once a minute; 'heap' sleeps until the next precomputed fire instant
+SCHEDULER_ENGINE = os.getenv("SCHEDULER_ENGINE", "cron").lower()
+SCHEDULER_RESYNC_SECONDS = float(os.getenv("SCHEDULER_RESYNC_SECONDS", "300"))
+# How often the heap engine checks whether another process changed the data
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "1"))
+# Only one process (e.g. among uvicorn --workers) runs the jobs at a time
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", f"{DB_PATH}.scheduler.lock")
+SCHEDULER_LEASE_RETRY_SECONDS = float(os.getenv("SCHEDULER_LEASE_RETRY_SECONDS", "5"))
+# Notifications whose instant passed while no scheduler ran are still sent if
+# they are at most this old; older ones are skipped as stale
+SCHEDULER_CATCHUP_HOURS = float(os.getenv("SCHEDULER_CATCHUP_HOURS", "24"))
+RENEWAL_TIME = time(0, 1)
+RETENTION_TIME = time(3, 30)
+# Rows per bulk UPDATE statement in renewal_job
+RENEWAL_BATCH_SIZE = 1000
+# Set to false when the jobs run in a separate `python -m app.scheduler` process
+SCHEDULER_IN_APP = os.getenv("SCHEDULER_IN_APP", "true").lower() in ("1", "true", "yes")
+
+# Overlapping or late ticks collapse into a single run instead of piling up
+scheduler = BackgroundScheduler(job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 30})
+fire_engine = None
+leader_lease = LeaderLease(SCHEDULER_LOCK_PATH, SCHEDULER_LEASE_RETRY_SECONDS)
+# Serializes notification passes from the cron tick, the heap engine and catch-up
+_notification_lock = threading.Lock()
+# job_id -> last completed run; mirrors job_runs for the process holding the lease
+_last_completed = {}
+# job_id -> dispatch lag and missed/coalesced tick counters since start
+job_stats = {}
+
+def _record_job_run(job_id, started_at):
+    """Persist the completion of a job run"""
+    finished_at = datetime.now()
+    _last_completed[job_id] = finished_at
+    db = SessionLocal()
+    try:
+        run = db.get(JobRun, job_id) or JobRun(job_id=job_id)
+        run.last_started_at = started_at
+        run.last_completed_at = finished_at
+        run.last_duration_ms = int((finished_at - started_at).total_seconds() * 1000)
+        db.add(run)
+        db.commit()
+    except Exception as e:
+        print(f"Failed to record run of {job_id}: {e}")
+    finally:
+        db.close()
+
+def last_completed_run(job_id):
+    """When job_id last finished successfully, or None if it never has"""
+    if job_id not in _last_completed:
+        db = SessionLocal()
+        try:
+            run = db.get(JobRun, job_id)
+            _last_completed[job_id] = run.last_completed_at if run else None
+        finally:
+            db.close()
+    return _last_completed[job_id]
+
+def _on_job_event(event):
+    stats = job_stats.setdefault(event.job_id, {"lag_seconds": None, "missed": 0, "coalesced": 0})
+    if event.code == EVENT_JOB_SUBMITTED:
+        scheduled = max(event.scheduled_run_times)
+        stats["lag_seconds"] = round((datetime.now(scheduled.tzinfo) - scheduled).total_seconds(), 3)
+    elif event.code == EVENT_JOB_MISSED:
+        stats["missed"] += 1
+    elif event.code == EVENT_JOB_MAX_INSTANCES:
+        # The previous run is still going; its pass will pick up whatever is due
+        stats["coalesced"] += 1
+
+scheduler.add_listener(_on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
 
 def notification_job():
-    """Check and send notifications every minute"""
+    """Send notifications whose precomputed next_notify_at has passed.
+
+    Returns the (kind, id, next_notify_at) of every row it rescheduled.
+    """
+    with _notification_lock:
+        return _notification_pass()
+
+def _notification_pass():
+    touched = []
     db = SessionLocal()
     try:
         now = datetime.now()
         today = now.date()
-        current_time = now.strftime("%H:%M")
         
-        # Get global settings
-        global_days_setting = db.query(Settings).filter(Settings.key == "global_days").first()
-        global_time_setting = db.query(Settings).filter(Settings.key == "global_time").first()
+        # Instants after the last completed pass were never looked at (downtime,
+        # overrun), so they are caught up rather than treated as stale
+        catchup_floor = now - timedelta(hours=SCHEDULER_CATCHUP_HOURS)
+        last_run = last_completed_run("notification_job")
+        if last_run and last_run > catchup_floor:
+            catchup_floor = last_run
+        
+        # Only rows that are due are loaded; the index on next_notify_at keeps this cheap
+        subscriptions = db.query(Subscription).filter(
+            Subscription.next_notify_at <= now,
+            Subscription.is_disabled == False
+        ).all()
+        reminders = db.query(Reminder).filter(
+            Reminder.next_notify_at <= now,
+            Reminder.is_sent == False,
+            Reminder.is_disabled == False
+        ).all()
         
-        global_days = json.loads(global_days_setting.value) if global_days_setting else [3, 1, 0]
-        global_time = global_time_setting.value if global_time_setting else "09:00"
+        if not subscriptions and not reminders:
+            _record_job_run("notification_job", now)
+            return touched
         
         notifier = Notifier(db)
+        digest_conf = load_digest_conf(db)
+        claim_token = new_claim_token()
+        outgoing = []
+        digest_entries = []
         
         # Process subscriptions
-        subscriptions = db.query(Subscription).filter(Subscription.is_disabled == False).all()
+        if subscriptions:
+            global_days, global_time = load_global_notify_settings(db)
         
         for sub in subscriptions:
-            # Determine notification settings
-            if sub.notify_mode == 'global':
-                notify_days = global_days
-                notify_time = global_time
-            else:
-                # Handle potential JSON parsing errors
-                notify_days = []
-                if sub.cust_days:
-                    try:
-                        notify_days = json.loads(sub.cust_days)
-                        # Validate that the parsed data is a list
-                        if not isinstance(notify_days, list):
-                            notify_days = []
-                            print(f"Warning: cust_days for subscription {sub.name} is not a list, using empty list instead")
-                    except json.JSONDecodeError as e:
-                        # Try to handle some common malformed JSON cases
-                        try:
-                            # Sometimes the data might be stored as a string representation of the list
-                            # For example, if "cust_days" was accidentally stored as "[1, 2, 3]" instead of proper JSON
-                            cleaned_data = sub.cust_days.strip()
-                            if cleaned_data.startswith("'") and cleaned_data.endswith("'"):
-                                # Handle single-quoted strings that should be double-quoted for JSON
-                                cleaned_data = cleaned_data.replace("'", '"')
-                            
-                            notify_days = json.loads(cleaned_data)
-                            if not isinstance(notify_days, list):
-                                notify_days = []
-                                print(f"Warning: cust_days for subscription {sub.name} is not a list, using empty list instead")
-                        except json.JSONDecodeError:
-                            # Check if it's a comma-separated string like "3,1,0" and convert to list
-                            try:
-                                # Handle comma-separated values (e.g., "3,1,0" -> [3, 1, 0])
-                                if ',' in sub.cust_days:
-                                    days_str = sub.cust_days.split(',')
-                                    notify_days = []
-                                    for day_str in days_str:
-                                        day_str = day_str.strip()
-                                        if day_str.lstrip('-').isdigit():  # Allow negative numbers
-                                            notify_days.append(int(day_str))
-                                    print(f"Warning: Converted comma-separated cust_days to list for subscription {sub.name}: {notify_days}")
-                                else:
-                                    # Try to parse as a single number in case it's not comma-separated
-                                    day_str = sub.cust_days.strip()
-                                    if day_str.lstrip('-').isdigit():
-                                        notify_days = [int(day_str)]
-                                        print(f"Warning: Converted single value cust_days to list for subscription {sub.name}: {notify_days}")
-                                    else:
-                                        print(f"Warning: Invalid JSON in cust_days for subscription {sub.name}: {e}, using empty list instead")
-                                        notify_days = []
-                            except (ValueError, AttributeError):
-                                print(f"Warning: Invalid JSON in cust_days for subscription {sub.name}: {e}, using empty list instead")
-                                notify_days = []
-                notify_time = sub.cust_time or "09:00"
-            
-            # Calculate days until next payment
-            days_until = (sub.next_date - today).days
-            
-            # Check if should notify
-            should_notify = (
-                days_until in notify_days and
-                current_time >= notify_time and
-                (not sub.last_sent or sub.last_sent.date() != today)
-            )
-            
-            if should_notify:
+            # A notification instant counts on its own day or when it was missed; stale ones are skipped
+            if sub.next_notify_at.date() == today or sub.next_notify_at > catchup_floor:
+                days_until = (sub.next_date - today).days
                 title = f"订阅提醒: {sub.name}"
                 content = f"服务: {sub.name}\n金额: ¥{sub.price}\n扣款日期: {sub.next_date}\n还有 {days_until} 天"
                 if sub.remarks:
                     content += f"\n备注: {sub.remarks}"
-                notifier.send_notification(title, content, sub.notify_email, sub.notify_wechat, sub.notify_webhook, sub.notify_resend)
-                
                 sub.last_sent = now
-                db.commit()
+                flags = (sub.notify_email, sub.notify_wechat, sub.notify_webhook, sub.notify_resend)
+                if uses_digest(digest_conf, sub.group_name):
+                    digest_entries.append((title, content, *flags))
+                else:
+                    outgoing += add_messages(db, notifier, "subscription", sub.id, title, content, *flags,
+                                             claim_token=claim_token)
+            
+            refresh_subscription(sub, global_days, global_time, now)
+            touched.append(("subscription", sub.id, sub.next_notify_at))
         
         # Process reminders
-        reminders = db.query(Reminder).filter(Reminder.is_sent == False, Reminder.is_disabled == False).all()
         for reminder in reminders:
-            should_notify = (
-                reminder.target_date == today and
-                current_time >= reminder.target_time
-            )
-            
-            if should_notify:
+            if reminder.target_date == today or reminder.next_notify_at > catchup_floor:
                 title = f"待办提醒: {reminder.title}"
                 # 构建内容，包含标题、内容和时间
                 reminder_content = f"提醒事项: {reminder.title}\n"
                 if reminder.content:
                     reminder_content += f"内容: {reminder.content}\n"
                 reminder_content += f"时间: {reminder.target_date} {reminder.target_time}"
-                notifier.send_notification(title, reminder_content, reminder.notify_email, reminder.notify_wechat, reminder.notify_webhook, reminder.notify_resend)
-                
                 reminder.is_sent = True
-                db.commit()
+                flags = (reminder.notify_email, reminder.notify_wechat, reminder.notify_webhook, reminder.notify_resend)
+                if uses_digest(digest_conf, reminder.group_name):
+                    digest_entries.append((title, reminder_content, *flags))
+                else:
+                    outgoing += add_messages(db, notifier, "reminder", reminder.id, title, reminder_content, *flags,
+                                             claim_token=claim_token)
+            
+            refresh_reminder(reminder, now)
+            touched.append(("reminder", reminder.id, reminder.next_notify_at))
+        
+        if digest_entries:
+            outgoing += add_digest_messages(db, notifier, digest_entries, claim_token)
+        
+        # Marking items sent and writing their outbox rows share one commit,
+        # so a send can fail or the process can die without losing the message
+        response_cache.mark_changed(db)
+        db.commit()
+        message_ids = [message.id for message in outgoing]
+        for i in range(0, len(message_ids), OUTBOX_BATCH_SIZE):
+            delivery_queue.submit(deliver, message_ids[i:i + OUTBOX_BATCH_SIZE], claim_token)
+        _record_job_run("notification_job", now)
                 
     except Exception as e:
+        db.rollback()
+        touched = []
         print(f"Notification job error:")
         traceback.print_exc()
     finally:
         db.close()
+    return touched
 
 def renewal_job():
     """Auto-renew subscriptions past due date"""
     db = SessionLocal()
     try:
-        today = date.today()
-        subscriptions = db.query(Subscription).filter(Subscription.next_date < today, Subscription.is_disabled == False).all()
+        now = datetime.now()
+        today = now.date()
+        yesterday = today - timedelta(days=1)
+        
+        # Only the columns needed to compute the new dates; no ORM objects
+        rows = db.query(
+            Subscription.id, Subscription.name, Subscription.next_date,
+            Subscription.cycle_val, Subscription.cycle_unit,
+            Subscription.notify_mode, Subscription.cust_days, Subscription.cust_time,
+            Subscription.last_sent
+        ).filter(Subscription.next_date < today, Subscription.is_disabled == False).all()
         
         # Get global settings for notification
-        global_days_setting = db.query(Settings).filter(Settings.key == "global_days").first()
-        global_days = json.loads(global_days_setting.value) if global_days_setting else [3, 1, 0]
+        global_days, global_time = load_global_notify_settings(db)
         
-        for sub in subscriptions:
-            # Check if subscription was due yesterday (would be 0-day notification today)
-            yesterday = today - timedelta(days=1)
-            if sub.next_date == yesterday:
-                # Determine if this subscription has 0-day notification enabled
-                if sub.notify_mode == 'global':
-                    notify_days = global_days
-                else:
-                    notify_days = []
-                    if sub.cust_days:
-                        try:
-                            notify_days = json.loads(sub.cust_days)
-                            if not isinstance(notify_days, list):
-                                notify_days = []
-                        except json.JSONDecodeError:
-                            notify_days = []
-                
-                # If 0-day notification is enabled, skip renewal for today
-                if 0 in notify_days:
-                    print(f"Skipping renewal for {sub.name} - 0-day notification pending")
-                    continue
+        updates = []
+        for row in rows:
+            notify_days, notify_time = subscription_notify_rule(row, global_days, global_time)
             
-            # Calculate next date based on cycle
-            if sub.cycle_unit == 'day':
-                sub.next_date = sub.next_date + timedelta(days=sub.cycle_val)
-            elif sub.cycle_unit == 'week':
-                sub.next_date = sub.next_date + timedelta(weeks=sub.cycle_val)
-            elif sub.cycle_unit == 'month':
-                sub.next_date = sub.next_date + relativedelta(months=sub.cycle_val)
-            elif sub.cycle_unit == 'year':
-                sub.next_date = sub.next_date + relativedelta(years=sub.cycle_val)
+            # If it was due yesterday and 0-day notification is enabled, skip renewal for today
+            if row.next_date == yesterday and 0 in notify_days:
+                print(f"Skipping renewal for {row.name} - 0-day notification pending")
+                continue
             
-            # Keep adding cycles until next_date is in the future
-            while sub.next_date < today:
-                if sub.cycle_unit == 'day':
-                    sub.next_date = sub.next_date + timedelta(days=sub.cycle_val)
-                elif sub.cycle_unit == 'week':
-                    sub.next_date = sub.next_date + timedelta(weeks=sub.cycle_val)
-                elif sub.cycle_unit == 'month':
-                    sub.next_date = sub.next_date + relativedelta(months=sub.cycle_val)
-                elif sub.cycle_unit == 'year':
-                    sub.next_date = sub.next_date + relativedelta(years=sub.cycle_val)
+            # Jump straight to the first cycle on or after today
+            next_date = advance_to(row.next_date, row.cycle_val, row.cycle_unit, today)
+            next_notify_at, next_notify_offset = next_subscription_fire(
+                next_date, notify_days, notify_time, row.last_sent, now
+            )
+            updates.append({
+                "_id": row.id,
+                "next_date": next_date,
+                "next_notify_at": next_notify_at,
+                "next_notify_offset": next_notify_offset,
+            })
         
+        # Bulk UPDATE ... WHERE id = ? in batches, all in one transaction
+        stmt = update(Subscription.__table__).where(Subscription.__table__.c.id == bindparam("_id"))
+        for i in range(0, len(updates), RENEWAL_BATCH_SIZE):
+            db.execute(stmt, updates[i:i + RENEWAL_BATCH_SIZE])
+        if updates:
+            response_cache.mark_changed(db)
         db.commit()
+        if updates:
+            print(f"Renewed {len(updates)} subscriptions")
+        _record_job_run("renewal_job", now)
     except Exception as e:
+        db.rollback()
         print(f"Renewal job error: {e}")
     finally:
         db.close()
+    # Renewal moves many next_notify_at values at once
+    reschedule_all()
+
+def retention_job():
+    """Move long-past reminders and long-disabled subscriptions into the archive tables"""
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        conf = settings_cache.get(db)["retention_conf"]
+        if conf["enabled"]:
+            reminders = archive_reminders(db, now.date() - timedelta(days=conf["reminder_days"]))
+            subscriptions = 0
+            if conf["archive_disabled_subscriptions"]:
+                subscriptions = archive_subscriptions(db, now - timedelta(days=conf["subscription_disabled_days"]))
+            if reminders or subscriptions:
+                print(f"Archived {reminders} reminders and {subscriptions} subscriptions")
+        _record_job_run("retention_job", now)
+    except Exception as e:
+        db.rollback()
+        print(f"Retention job error: {e}")
+    finally:
+        db.close()
+
+def catch_up_job():
+    """Run whatever was missed while no scheduler was running"""
+    # The heap engine fires overdue entries as soon as it loads them
+    if SCHEDULER_ENGINE != "heap":
+        notification_job()
+    
+    now = datetime.now()
+    last_window = datetime.combine(now.date(), RENEWAL_TIME)
+    if now < last_window:
+        last_window -= timedelta(days=1)
+    last_run = last_completed_run("renewal_job")
+    if last_run is None or last_run < last_window:
+        print(f"Catching up renewal_job (last completed: {last_run})")
+        renewal_job()
+
+def scheduler_status(db):
+    """How far behind the scheduler is, for the status endpoint"""
+    now = datetime.now()
+    jobs = []
+    for run in db.query(JobRun).order_by(JobRun.job_id).all():
+        job = scheduler.get_job(run.job_id) if scheduler.running else None
+        jobs.append({
+            "job_id": run.job_id,
+            "last_started_at": run.last_started_at,
+            "last_completed_at": run.last_completed_at,
+            "last_duration_ms": run.last_duration_ms,
+            "next_run_at": job.next_run_time if job else None,
+            **job_stats.get(run.job_id, {}),
+        })
+    
+    oldest = []
+    for model, pending in ((Subscription, Subscription.is_disabled == False),
+                           (Reminder, (Reminder.is_sent == False) & (Reminder.is_disabled == False))):
+        query = db.query(model.next_notify_at).filter(model.next_notify_at <= now, pending)
+        oldest.append((query.order_by(model.next_notify_at).limit(1).scalar(), query.count()))
+    oldest_due = min((when for when, _ in oldest if when), default=None)
+    
+    return {
+        "engine": SCHEDULER_ENGINE,
+        "is_leader": leader_lease.is_leader,
+        "running": scheduler.running,
+        "jobs": jobs,
+        "due_subscriptions": oldest[0][1],
+        "due_reminders": oldest[1][1],
+        "oldest_due_at": oldest_due,
+        "behind_seconds": round((now - oldest_due).total_seconds(), 3) if oldest_due else 0,
+        "delivery_queue_depth": delivery_queue.depth(),
+        "outbox": outbox_counts(db),
+    }
+
+def _load_fire_entries():
+    """All pending fire instants, for (re)filling the heap engine"""
+    db = SessionLocal()
+    try:
+        subs = db.query(Subscription.id, Subscription.next_notify_at).filter(
+            Subscription.next_notify_at != None,
+            Subscription.is_disabled == False
+        ).all()
+        reminders = db.query(Reminder.id, Reminder.next_notify_at).filter(
+            Reminder.next_notify_at != None,
+            Reminder.is_sent == False,
+            Reminder.is_disabled == False
+        ).all()
+        return [("subscription", i, t) for i, t in subs] + [("reminder", i, t) for i, t in reminders]
+    finally:
+        db.close()
+
+def _read_data_version():
+    db = SessionLocal()
+    try:
+        return read_version(db, DATA_VERSION_KEY)
+    finally:
+        db.close()
+
+def _fire_due(due):
+    """Heap engine callback: run the notification pass and reschedule due items"""
+    touched = notification_job()
+    seen = {(kind, item_id) for kind, item_id, _ in touched}
+    missing = {"subscription": [], "reminder": []}
+    for kind, item_id in due:
+        if (kind, item_id) not in seen:
+            missing[kind].append(item_id)
+    if not missing["subscription"] and not missing["reminder"]:
+        return touched
+
+    # Items that were not processed (changed elsewhere, or still failing) are
+    # re-read; anything still in the past waits for the next resync
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        for kind, model in (("subscription", Subscription), ("reminder", Reminder)):
+            if not missing[kind]:
+                continue
+            rows = db.query(model.id, model.next_notify_at).filter(model.id.in_(missing[kind])).all()
+            for item_id, when in rows:
+                touched.append((kind, item_id, when if when and when > now else None))
+    finally:
+        db.close()
+    return touched
+
+def schedule_changed(kind, item_id, next_notify_at):
+    """Tell the heap engine that an item's next_notify_at changed (None removes it)"""
+    if fire_engine is not None:
+        fire_engine.update(kind, item_id, next_notify_at)
+
+def reschedule_all():
+    """Tell the heap engine that many fire instants changed at once"""
+    if fire_engine is not None:
+        fire_engine.reload()
+
+def _start_engines():
+    global fire_engine
+    delivery_queue.start()
+    if SCHEDULER_ENGINE == "heap":
+        fire_engine = FireEngine(
+            _load_fire_entries, _fire_due, SCHEDULER_RESYNC_SECONDS,
+            version=_read_data_version, poll_seconds=SCHEDULER_POLL_SECONDS
+        )
+        fire_engine.start()
+    else:
+        scheduler.add_job(notification_job, CronTrigger.from_crontab('* * * * *'), id="notification_job")  # Every minute
+    scheduler.start()
+    scheduler.add_job(catch_up_job, id="catch_up")  # Once, right away
+
+def start_scheduler():
+    """Start the configured scheduling engine once this process holds the leader lease"""
+    leader_lease.start(_start_engines)
+
+def stop_scheduler():
+    """Stop whichever engine start_scheduler() started and give up the lease"""
+    global fire_engine
+    if scheduler.running:
+        scheduler.shutdown()
+    if fire_engine is not None:
+        fire_engine.shutdown()
+        fire_engine = None
+    leader_lease.release()
+
+# Add jobs to scheduler; notification_job is added by start_scheduler() in cron mode
+scheduler.add_job(
+    renewal_job, CronTrigger(hour=RENEWAL_TIME.hour, minute=RENEWAL_TIME.minute),
+    id="renewal_job", misfire_grace_time=6 * 3600
+)  # Daily at 00:01
+scheduler.add_job(outbox_retry_job, CronTrigger.from_crontab('* * * * *'), id="outbox_retry_job")  # Every minute
+scheduler.add_job(
+    retention_job, CronTrigger(hour=RETENTION_TIME.hour, minute=RETENTION_TIME.minute),
+    id="retention_job", misfire_grace_time=6 * 3600
+)  # Daily at 03:30
+scheduler.add_job(
+    sync_channel_state, IntervalTrigger(seconds=CHANNEL_STATE_SECONDS), id="channel_state_job"
+)  # Publishes the leader's channel guards for /api/notifications/channels
+
+def main():
+    """Run the scheduler on its own, coordinating with the web app only through the database"""
+    from .database import run_migrations
+    run_migrations()
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    start_scheduler()
+    print(f"Scheduler process started (engine: {SCHEDULER_ENGINE}, pid {os.getpid()})")
+    stop.wait()
+    print("Scheduler process stopping...")
+    stop_scheduler()
+    delivery_queue.shutdown()
+    smtp_pool.close_all()
+    transport.close()
+    delivery_log.flush()
 
-# Add jobs to scheduler
-scheduler.add_job(notification_job, CronTrigger.from_crontab('* * * * *'))  # Every minute
-scheduler.add_job(renewal_job, CronTrigger.from_crontab('1 0 * * *'))  # Daily at 00:01
+if __name__ == "__main__":
+    main()
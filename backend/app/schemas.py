@@ -1,7 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
 from datetime import date, datetime
 
+# Ids or items accepted by one bulk request
+BULK_MAX_ITEMS = 1000
+# Bulk patches move dates by at most a century; SQLite date() returns NULL out of range
+MAX_SHIFT_DAYS = 36500
+
 class SubscriptionBase(BaseModel):
     name: str
     price: float
@@ -28,10 +33,55 @@ class SubscriptionUpdate(SubscriptionBase):
 class SubscriptionResponse(SubscriptionBase):
     id: int
     last_sent: Optional[datetime] = None
+    next_notify_at: Optional[datetime] = None
+    next_notify_offset: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+class SubscriptionFilter(BaseModel):
+    group_name: Optional[str] = None
+    is_disabled: Optional[bool] = None
+    next_date_from: Optional[date] = None
+    next_date_to: Optional[date] = None
+    name_prefix: Optional[str] = None
+
+class SubscriptionPatch(BaseModel):
+    name: Optional[str] = None
+    price: Optional[float] = None
+    cycle_val: Optional[int] = None
+    cycle_unit: Optional[str] = None
+    next_date: Optional[date] = None
+    # Move next_date by this many days instead of setting it
+    shift_days: Optional[int] = Field(None, ge=-MAX_SHIFT_DAYS, le=MAX_SHIFT_DAYS)
+    notify_mode: Optional[str] = None
+    cust_days: Optional[str] = None
+    cust_time: Optional[str] = None
+    group_name: Optional[str] = None
+    is_disabled: Optional[bool] = None
+    remarks: Optional[str] = None
+    notify_email: Optional[bool] = None
+    notify_wechat: Optional[bool] = None
+    notify_webhook: Optional[bool] = None
+
+class SubscriptionBulkCreate(BaseModel):
+    items: List[SubscriptionCreate] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class SubscriptionBulkUpdateItem(SubscriptionUpdate):
+    id: int
+
+class SubscriptionBulkUpdate(BaseModel):
+    items: List[SubscriptionBulkUpdateItem] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class SubscriptionBulkPatch(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=BULK_MAX_ITEMS)
+    filter: Optional[SubscriptionFilter] = None
+    changes: SubscriptionPatch
+
+class SubscriptionBulkDelete(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=BULK_MAX_ITEMS)
+    filter: Optional[SubscriptionFilter] = None
+
 class ReminderBase(BaseModel):
     title: str
     content: Optional[str] = None  # 添加内容字段
@@ -53,12 +103,107 @@ class ReminderUpdate(ReminderBase):
 class ReminderResponse(ReminderBase):
     id: int
     is_sent: bool
+    next_notify_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+class ReminderFilter(BaseModel):
+    group_name: Optional[str] = None
+    is_disabled: Optional[bool] = None
+    is_sent: Optional[bool] = None
+    target_date_from: Optional[date] = None
+    target_date_to: Optional[date] = None
+    title_prefix: Optional[str] = None
+
+class ReminderPatch(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    target_date: Optional[date] = None
+    # Move target_date by this many days instead of setting it
+    shift_days: Optional[int] = Field(None, ge=-MAX_SHIFT_DAYS, le=MAX_SHIFT_DAYS)
+    target_time: Optional[str] = None
+    group_name: Optional[str] = None
+    is_disabled: Optional[bool] = None
+    notify_email: Optional[bool] = None
+    notify_wechat: Optional[bool] = None
+    notify_webhook: Optional[bool] = None
+
+class ReminderBulkCreate(BaseModel):
+    items: List[ReminderCreate] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class ReminderBulkUpdateItem(ReminderUpdate):
+    id: int
+
+class ReminderBulkUpdate(BaseModel):
+    items: List[ReminderBulkUpdateItem] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class ReminderBulkPatch(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=BULK_MAX_ITEMS)
+    filter: Optional[ReminderFilter] = None
+    changes: ReminderPatch
+
+class ReminderBulkDelete(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=BULK_MAX_ITEMS)
+    filter: Optional[ReminderFilter] = None
+
+class BulkItemResult(BaseModel):
+    index: Optional[int] = None  # Position in the request's items, for create and update
+    id: Optional[int] = None
+    status: str  # 'created', 'updated', 'deleted' or 'not_found'
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+    counts: Dict[str, int]
+
+class ArchivedSubscriptionResponse(SubscriptionBase):
+    id: int
+    item_id: int
+    archived_at: datetime
+    last_sent: Optional[datetime] = None
+    disabled_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class ArchivedReminderResponse(ReminderBase):
+    id: int
+    item_id: int
+    archived_at: datetime
+    is_sent: bool
+    
+    class Config:
+        from_attributes = True
+
+class DigestConf(BaseModel):
+    enabled: bool = False
+    groups: Dict[str, bool] = {}  # Per-group override of `enabled`
+
+class RetentionConf(BaseModel):
+    enabled: bool = False
+    reminder_days: int = Field(90, ge=0)
+    archive_disabled_subscriptions: bool = False
+    subscription_disabled_days: int = Field(365, ge=0)
+
 class BackupData(BaseModel):
     meta: dict
     settings: dict
     subscriptions: List[dict]
-    reminders: List[dict]
\ No newline at end of file
+    reminders: List[dict]
+
+class DeliveryLogResponse(BaseModel):
+    id: int
+    item_type: Optional[str] = None
+    item_id: Optional[int] = None
+    channel: str
+    started_at: datetime
+    duration_ms: int
+    outcome: str
+    error: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class DeliveryLogPage(BaseModel):
+    items: List[DeliveryLogResponse]
+    next_before_id: Optional[int] = None
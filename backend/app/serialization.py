@@ -0,0 +1,35 @@
+from typing import Iterable, List, Sequence
+import orjson
+from fastapi import Response
+
+
+def dumps(content) -> bytes:
+    """orjson encoding; dates and datetimes come out in isoformat, like the Pydantic path"""
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    """JSONResponse encoded with orjson"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def response_columns(model, schema) -> list:
+    """Table columns behind each field of a response schema, in the schema's field order"""
+    return [model.__table__.c[name] for name in schema.model_fields]
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> List[dict]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def column_encoder(columns: list):
+    """Encoder for rows selected with `columns`.
+
+    Rows straight from our own tables are trusted, so they are zipped
+    into dicts and encoded without building a Pydantic model per row.
+    """
+    fields = tuple(column.key for column in columns)
+    return lambda rows: dumps(rows_to_dicts(rows, fields))
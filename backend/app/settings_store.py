@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+from pydantic import ValidationError
+from sqlalchemy import event, text
+from .database import SessionLocal
+from .models import Settings, AppState
+from .schemas import DigestConf, RetentionConf
+from .notify_schedule import compile_notify_days, DEFAULT_NOTIFY_DAYS, DEFAULT_NOTIFY_TIME
+
+# How often a process checks whether another process changed the settings
+SETTINGS_POLL_SECONDS = float(os.getenv("SETTINGS_POLL_SECONDS", "1"))
+SETTINGS_VERSION_KEY = "settings_version"
+
+
+def _json(value: Optional[str]):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_digest_conf(conf) -> dict:
+    """Digest settings: a global switch plus per-group overrides"""
+    try:
+        return DigestConf.model_validate(conf if isinstance(conf, dict) else {}).model_dump()
+    except ValidationError as e:
+        # Stored before PUT /api/settings validated it, or restored from a backup
+        print(f"Invalid stored digest_conf, digest mode off: {e}")
+        return DigestConf().model_dump()
+
+
+DEFAULT_RETENTION_CONF = RetentionConf().model_dump()
+
+
+def parse_retention_conf(conf) -> dict:
+    """Retention policy: how long past reminders and disabled subscriptions stay live"""
+    try:
+        return RetentionConf.model_validate(conf if isinstance(conf, dict) else {}).model_dump()
+    except ValidationError as e:
+        # Stored before PUT /api/settings validated it, or restored from a backup
+        print(f"Invalid stored retention_conf, using defaults: {e}")
+        return dict(DEFAULT_RETENTION_CONF)
+
+
+def parse_settings(rows: dict) -> dict:
+    """Typed settings from raw {key: stored text}, with the same defaults the routes used"""
+    values = {key: _json(value) for key, value in rows.items()}
+    values.update(
+        smtp_conf=values.get("smtp_conf"),
+        wechat_conf=values.get("wechat_conf"),
+        webhook_conf=values.get("webhook_conf") or {"webhook_key": ""},
+        resend_conf=values.get("resend_conf"),
+        global_days=compile_notify_days(rows["global_days"]) if "global_days" in rows else tuple(DEFAULT_NOTIFY_DAYS),
+        global_time=rows.get("global_time") or DEFAULT_NOTIFY_TIME,
+        digest_conf=parse_digest_conf(values.get("digest_conf")),
+        retention_conf=parse_retention_conf(values.get("retention_conf")),
+    )
+    return values
+
+
+def bump_version(db, key: str):
+    """Increment a change counter inside the caller's transaction"""
+    db.execute(
+        text("INSERT INTO app_state (key, value) VALUES (:key, 1) "
+             "ON CONFLICT(key) DO UPDATE SET value = value + 1"),
+        {"key": key}
+    )
+
+
+def read_version(db, key: str) -> int:
+    return db.query(AppState.value).filter(AppState.key == key).scalar() or 0
+
+
+class SettingsCache:
+    """All settings parsed once and kept in memory.
+
+    Writers call invalidate() in the transaction that changes the settings
+    table; it bumps a version counter in app_state. Readers re-check that
+    counter at most every `poll_seconds`, so the web and scheduler
+    processes both pick up changes, and reload every key in one query only
+    when it moved.
+    """
+
+    def __init__(self, poll_seconds: float = SETTINGS_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._values: Optional[dict] = None
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db=None, force: bool = False) -> dict:
+        """Current settings; callers must treat the returned values as read-only
+
+        `force` re-checks the version now instead of trusting the poll window.
+        """
+        values = self._values
+        if not force and values is not None and time.monotonic() - self._checked < self.poll_seconds:
+            return values
+        with self._lock:
+            if not force and self._values is not None and time.monotonic() - self._checked < self.poll_seconds:
+                return self._values
+            session = db or SessionLocal()
+            try:
+                version = read_version(session, SETTINGS_VERSION_KEY)
+                if self._values is None or version != self._version:
+                    rows = dict(session.query(Settings.key, Settings.value).all())
+                    self._values = parse_settings(rows)
+                    self._version = version
+            finally:
+                if db is None:
+                    session.close()
+            self._checked = time.monotonic()
+            return self._values
+
+    def clear(self):
+        self._values = None
+
+    def invalidate(self, db):
+        """Record a settings change; this process reloads once the transaction commits"""
+        bump_version(db, SETTINGS_VERSION_KEY)
+        event.listen(db, "after_commit", lambda session: self.clear(), once=True)
+
+
+settings_cache = SettingsCache()
@@ -0,0 +1,126 @@
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# Idle sessions are closed after this many seconds
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+# Sessions idle for longer than this are checked with NOOP before reuse
+SMTP_NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", "5"))
+SMTP_MAX_IDLE_PER_SERVER = 4
+
+
+def _pool_key(conf: dict) -> Tuple:
+    return (conf.get('host'), conf.get('port'), conf.get('username'), conf.get('password'), bool(conf.get('use_tls')))
+
+
+def _close(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+class SMTPPool:
+    """Authenticated SMTP sessions reused across sends, one pool per smtp_conf.
+
+    Sessions are handed out one caller at a time, probed with NOOP when
+    they have been idle a while, and closed by a reaper thread once they
+    have been idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, idle_timeout: float = SMTP_IDLE_TIMEOUT, noop_after: float = SMTP_NOOP_AFTER,
+                 max_idle: int = SMTP_MAX_IDLE_PER_SERVER, timeout: float = SMTP_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle: Dict[Tuple, List[Tuple[smtplib.SMTP, float]]] = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self.opened = 0
+
+    def _open(self, conf: dict) -> smtplib.SMTP:
+        server = smtplib.SMTP(conf.get('host'), conf.get('port'), timeout=self.timeout)
+        try:
+            if conf.get('use_tls'):
+                server.starttls()
+            if conf.get('username'):
+                server.login(conf.get('username'), conf.get('password'))
+        except Exception:
+            _close(server)
+            raise
+        self.opened += 1
+        return server
+
+    def _alive(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self, conf: dict) -> smtplib.SMTP:
+        key = _pool_key(conf)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                server, last_used = idle.pop()
+            if time.monotonic() - last_used < self.noop_after or self._alive(server):
+                return server
+            _close(server)
+        return self._open(conf)
+
+    def _checkin(self, conf: dict, server: smtplib.SMTP):
+        key = _pool_key(conf)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((server, time.monotonic()))
+                server = None
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="smtp-reaper", daemon=True)
+                self._reaper.start()
+        if server is not None:
+            _close(server)
+
+    @contextmanager
+    def connection(self, conf: dict):
+        """Borrow an authenticated session; it is discarded if the block raises"""
+        server = self._checkout(conf)
+        try:
+            yield server
+        except Exception:
+            _close(server)
+            raise
+        self._checkin(conf, server)
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            expired = []
+            now = time.monotonic()
+            with self._lock:
+                for key, idle in self._idle.items():
+                    keep = [(s, t) for s, t in idle if now - t < self.idle_timeout]
+                    expired += [s for s, t in idle if now - t >= self.idle_timeout]
+                    idle[:] = keep
+            for server in expired:
+                _close(server)
+
+    def close_all(self):
+        with self._lock:
+            servers = [s for idle in self._idle.values() for s, _ in idle]
+            self._idle.clear()
+        for server in servers:
+            _close(server)
+
+
+smtp_pool = SMTPPool()
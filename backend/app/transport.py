@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from typing import Optional
+import httpx
+
+# Connect/read deadlines per HTTP channel
+CHANNEL_TIMEOUTS = {
+    "wechat": httpx.Timeout(10.0, connect=5.0),
+    "webhook": httpx.Timeout(10.0, connect=5.0),
+    "resend": httpx.Timeout(15.0, connect=5.0),
+}
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+
+class AsyncTransport:
+    """Shared keep-alive HTTP client running on a dedicated event loop thread.
+
+    Synchronous callers (delivery workers, the settings test endpoints)
+    submit coroutines with run(); every HTTP call reuses the same pooled
+    httpx.AsyncClient, so connections and TLS sessions are kept alive
+    between notifications.
+    """
+
+    def __init__(self, max_connections: int = 20):
+        self.max_connections = max_connections
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                loop = asyncio.new_event_loop()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_loop, name="notify-transport", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Only touched from coroutines running on self.loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the transport loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def get_json(self, channel: str, url: str, **kwargs) -> dict:
+        response = await self.client.get(url, timeout=CHANNEL_TIMEOUTS.get(channel, DEFAULT_TIMEOUT), **kwargs)
+        return response.json()
+
+    async def post(self, channel: str, url: str, **kwargs) -> httpx.Response:
+        return await self.client.post(url, timeout=CHANNEL_TIMEOUTS.get(channel, DEFAULT_TIMEOUT), **kwargs)
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(5)
+            except Exception:
+                pass
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+        self._thread = None
+
+
+transport = AsyncTransport()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark: latency of small API requests while /api/export runs
+
+Starts the app with uvicorn against a throwaway database seeded with
+--rows subscriptions, then measures GET /api/subscriptions/{id} latency
+from several clients, first on its own and then while another client
+downloads /api/export in a loop. With handlers off the event loop the
+tail latency should stay roughly flat between the two phases.
+
+    python bench_concurrency.py --rows 50000 --clients 8 --seconds 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def seed(db_path: str, rows: int):
+    os.environ["DB_PATH"] = db_path
+    sys.path.insert(0, BACKEND_DIR)
+    from app.database import engine, run_migrations
+    from app.models import Subscription
+
+    run_migrations()
+    today = date.today()
+    batch = [
+        {"name": f"sub-{i}", "price": 9.9, "cycle_val": 1, "cycle_unit": "month",
+         "next_date": today + timedelta(days=i % 365), "notify_mode": "global", "group_name": f"g{i % 20}"}
+        for i in range(rows)
+    ]
+    with engine.begin() as conn:
+        conn.execute(Subscription.__table__.insert(), batch)
+    engine.dispose()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def probe(base: str, headers: dict, clients: int, seconds: float, rows: int):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(n):
+        with httpx.Client(base_url=base, headers=headers, timeout=60) as http:
+            i = n
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                http.get(f"/api/subscriptions/{i % rows + 1}").raise_for_status()
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                i += clients
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def report(label: str, latencies, seconds: float):
+    print(f"{label:<16} {len(latencies) / seconds:8.0f} req/s   "
+          f"p50 {percentile(latencies, 50):7.1f} ms   p95 {percentile(latencies, 95):7.1f} ms   "
+          f"p99 {percentile(latencies, 99):7.1f} ms   max {max(latencies):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="subkeeper-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    print(f"Seeding {args.rows} subscriptions into {db_path}...")
+    seed(db_path, args.rows)
+
+    env = dict(os.environ, DB_PATH=db_path, ADMIN_PASSWORD=os.getenv("ADMIN_PASSWORD", "bench"),
+               SCHEDULER_IN_APP="false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(100):
+            try:
+                token = httpx.post(f"{base}/api/auth/login", json={"password": env["ADMIN_PASSWORD"]}).json()["access_token"]
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        else:
+            raise SystemExit("Server did not start")
+        headers = {"Authorization": f"Bearer {token}"}
+
+        report("idle", probe(base, headers, args.clients, args.seconds, args.rows), args.seconds)
+
+        exports = []
+        stop = threading.Event()
+
+        def exporter():
+            with httpx.Client(base_url=base, headers=headers, timeout=300) as http:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    http.get("/api/export").raise_for_status()
+                    exports.append(time.perf_counter() - start)
+
+        thread = threading.Thread(target=exporter)
+        thread.start()
+        time.sleep(0.2)
+        latencies = probe(base, headers, args.clients, args.seconds, args.rows)
+        stop.set()
+        thread.join()
+        report("during export", latencies, args.seconds)
+        print(f"{len(exports)} exports, {sum(exports) / max(1, len(exports)):.2f} s each")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark: list and export responses, Pydantic/stdlib path vs the column + orjson path
+
+Seeds a throwaway database with --rows subscriptions and as many reminders
+(plus a tenth as many archived ones), then times building the JSON body of GET /api/subscriptions/, GET
+/api/reminders/ and /api/export both ways, in process (no HTTP):
+
+  baseline  ORM objects validated through SubscriptionResponse /
+            ReminderResponse (from_attributes), and the export's
+            hand-built dicts encoded by JSONResponse
+  fast      the selected columns as tuples, zipped into dicts and encoded
+            by orjson, as the routes do now
+
+Each pair of bodies is checked to decode to the same data.
+
+    python bench_serialization.py --rows 10000,100000 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def seed(rows: int):
+    from app.database import engine, run_migrations
+    from app.models import Subscription, Reminder, ArchivedSubscription, ArchivedReminder
+
+    run_migrations()
+    today = date.today()
+    now = datetime.now()
+    subscriptions = [
+        {"name": f"sub-{i}", "price": 9.9 + i % 7, "cycle_val": 1, "cycle_unit": "month",
+         "next_date": today + timedelta(days=i % 365), "notify_mode": "global", "group_name": f"g{i % 20}",
+         "remarks": "备注" if i % 3 == 0 else None, "last_sent": now - timedelta(days=i % 30) if i % 2 else None,
+         "next_notify_at": now + timedelta(hours=i % 500), "next_notify_offset": i % 4}
+        for i in range(rows)
+    ]
+    reminders = [
+        {"title": f"reminder-{i}", "content": "内容" * (i % 5), "target_date": today + timedelta(days=i % 90),
+         "target_time": "09:00", "group_name": f"g{i % 20}", "is_sent": bool(i % 2)}
+        for i in range(rows)
+    ]
+    # A tenth as many archived rows, so the export covers the archive tables too
+    archived = [(ArchivedSubscription, subscriptions), (ArchivedReminder, reminders)]
+    with engine.begin() as conn:
+        conn.execute(Subscription.__table__.insert(), subscriptions)
+        conn.execute(Reminder.__table__.insert(), reminders)
+        for model, live in archived:
+            columns = model.__table__.c
+            conn.execute(model.__table__.insert(), [
+                {**{key: value for key, value in row.items() if key in columns}, "item_id": rows + i, "archived_at": now}
+                for i, row in enumerate(live[:rows // 10])
+            ])
+
+
+def legacy_export(db) -> bytes:
+    """/api/export as it was: ORM objects, dicts by hand, stdlib JSON"""
+    from fastapi.responses import JSONResponse
+    from app.models import Settings, Subscription, Reminder, ArchivedSubscription, ArchivedReminder
+
+    settings_dict = {}
+    for setting in db.query(Settings).all():
+        if setting.key in ['smtp_conf', 'wechat_conf', 'global_days', 'digest_conf', 'retention_conf']:
+            settings_dict[setting.key] = json.loads(setting.value)
+        else:
+            settings_dict[setting.key] = setting.value
+    subscriptions = [{
+        "id": sub.id, "name": sub.name, "price": sub.price, "cycle_val": sub.cycle_val,
+        "cycle_unit": sub.cycle_unit, "next_date": sub.next_date.isoformat(), "notify_mode": sub.notify_mode,
+        "cust_days": sub.cust_days, "cust_time": sub.cust_time,
+        "last_sent": sub.last_sent.isoformat() if sub.last_sent else None, "group_name": sub.group_name,
+        "is_disabled": sub.is_disabled, "remarks": sub.remarks, "notify_email": sub.notify_email,
+        "notify_wechat": sub.notify_wechat, "notify_webhook": sub.notify_webhook, "notify_resend": sub.notify_resend
+    } for sub in db.query(Subscription).all()]
+    reminders = [{
+        "id": reminder.id, "title": reminder.title, "content": reminder.content,
+        "target_date": reminder.target_date.isoformat(), "target_time": reminder.target_time,
+        "is_sent": reminder.is_sent, "group_name": reminder.group_name, "is_disabled": reminder.is_disabled,
+        "notify_email": reminder.notify_email, "notify_wechat": reminder.notify_wechat,
+        "notify_webhook": reminder.notify_webhook, "notify_resend": reminder.notify_resend
+    } for reminder in db.query(Reminder).all()]
+    archives = {}
+    for key, model in (("subscriptions_archive", ArchivedSubscription), ("reminders_archive", ArchivedReminder)):
+        names = [column.name for column in model.__table__.columns if column.name != "id"]
+        archives[key] = [{
+            name: value.isoformat() if isinstance(value, (date, datetime)) else value
+            for name, value in ((name, getattr(row, name)) for name in names)
+        } for row in db.query(model).all()]
+    backup = {"meta": {"version": "1.0", "time": "bench"}, "settings": settings_dict,
+              "subscriptions": subscriptions, "reminders": reminders, **archives}
+    return JSONResponse(content=backup).body
+
+
+def cases(session_factory):
+    from pydantic import TypeAdapter
+    from app.models import Subscription, Reminder
+    from app.schemas import SubscriptionResponse, ReminderResponse
+    from app.routes import subscriptions as subscription_routes, reminders as reminder_routes
+    from app.routes.backup import export_data
+
+    subscription_adapter = TypeAdapter(List[SubscriptionResponse])
+    reminder_adapter = TypeAdapter(List[ReminderResponse])
+
+    def with_session(fn):
+        def run():
+            db = session_factory()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+        return run
+
+    def fast_export(db):
+        body = export_data(db=db, current_user="bench").body
+        # meta.time is the only field that differs between runs
+        data = json.loads(body)
+        data["meta"]["time"] = "bench"
+        return body, data
+
+    return [
+        ("subscriptions list",
+         with_session(lambda db: subscription_adapter.dump_json(
+             subscription_adapter.validate_python(db.query(Subscription).all(), from_attributes=True))),
+         with_session(lambda db: subscription_routes.encode_list(db.query(*subscription_routes.LIST_COLUMNS).all()))),
+        ("reminders list",
+         with_session(lambda db: reminder_adapter.dump_json(
+             reminder_adapter.validate_python(db.query(Reminder).all(), from_attributes=True))),
+         with_session(lambda db: reminder_routes.encode_list(db.query(*reminder_routes.LIST_COLUMNS).all()))),
+        ("export",
+         with_session(legacy_export),
+         with_session(fast_export)),
+    ]
+
+
+def timed(fn, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def decoded(body):
+    if isinstance(body, tuple):
+        return body[1]
+    return json.loads(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000", help="comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'case':<20} {'baseline':>10} {'fast':>10} {'speedup':>8} {'size':>10}")
+    for rows in [int(n) for n in args.rows.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+            os.environ.setdefault("SCHEDULER_IN_APP", "false")
+            # The route modules import app.auth, which refuses to load without one
+            os.environ.setdefault("ADMIN_PASSWORD", "bench")
+            # A fresh app package per database, so the engine binds to this DB_PATH
+            for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+                del sys.modules[name]
+            seed(rows)
+            from app.database import ReadSessionLocal, engine, read_engine
+            for name, baseline, fast in cases(ReadSessionLocal):
+                baseline()  # warm up statement caches
+                fast()
+                baseline_time, baseline_body = timed(baseline, args.repeat)
+                fast_time, fast_body = timed(fast, args.repeat)
+                assert decoded(baseline_body) == decoded(fast_body), f"{name}: bodies differ"
+                size = len(fast_body[0] if isinstance(fast_body, tuple) else fast_body)
+                print(f"{rows:>8}  {name:<20} {baseline_time * 1000:>8.0f}ms {fast_time * 1000:>8.0f}ms "
+                      f"{baseline_time / fast_time:>7.1f}x {size / 1e6:>8.1f}MB")
+            engine.dispose()
+            read_engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, BACKEND_DIR)
+    main()
@@ -2,23 +2,39 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from app.database import engine, Base, run_migrations
+import os
+import anyio.to_thread
+from app.database import run_migrations
 # from scheduler import scheduler_service
 # from notifications import NotificationService
-from app.routes import settings, subscriptions, reminders, backup, auth
+from app.routes import settings, subscriptions, reminders, backup, auth, scheduler, notifications, archive
+
+# Route handlers are plain functions run in this many worker threads, so
+# database work never blocks the event loop
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "40"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Create tables and run migrations
-    from app.scheduler import scheduler
-    # Create all tables, including any new columns
-    Base.metadata.create_all(bind=engine)
-    # Run migrations to update existing tables with new columns
+    from app.scheduler import start_scheduler, stop_scheduler, SCHEDULER_IN_APP
+    from app.delivery import delivery_queue
+    from app.smtp_pool import smtp_pool
+    from app.transport import transport
+    from app.delivery_log import delivery_log
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+    # Create or upgrade the schema; a single version check when it is current
     run_migrations()
-    scheduler.start()
+    # Scheduling can be moved to a dedicated `python -m app.scheduler` process
+    if SCHEDULER_IN_APP:
+        start_scheduler()
     yield
-    # Shutdown: Stop scheduler
-    scheduler.shutdown()
+    # Shutdown: Stop scheduler, then let queued notifications go out
+    if SCHEDULER_IN_APP:
+        stop_scheduler()
+        delivery_queue.shutdown()
+        smtp_pool.close_all()
+    transport.close()
+    delivery_log.flush()
 
 app = FastAPI(title="SubKeeper", lifespan=lifespan)
 
@@ -28,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
@@ -35,6 +52,9 @@ app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
 app.include_router(subscriptions.router, prefix="/api/subscriptions", tags=["subscriptions"])
 app.include_router(reminders.router, prefix="/api/reminders", tags=["reminders"])
 app.include_router(backup.router, prefix="/api", tags=["backup"])
+app.include_router(scheduler.router, prefix="/api/scheduler", tags=["scheduler"])
+app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
+app.include_router(archive.router, prefix="/api/archive", tags=["archive"])
 
 # Mount static files for frontend
 app.mount("/", StaticFiles(directory="static", html=True), name="static")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the writer lock survives a session closed on another thread
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import date
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# A throwaway database with a short busy timeout, unless the caller chose one
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "test_write_lock.db"))
+os.environ.setdefault("DB_BUSY_TIMEOUT_MS", "200")
+
+from app.database import SessionLocal, DB_PATH, run_migrations
+from app.models import Reminder
+
+def in_thread(fn):
+    """Run fn on a new thread, like FastAPI's threadpool does for sync dependencies"""
+    outcome = {}
+    def run():
+        try:
+            outcome["result"] = fn()
+        except Exception as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
+
+def add_reminder(db, title):
+    db.add(Reminder(title=title, target_date=date.today(), target_time="09:00"))
+    db.commit()
+
+def mark_all_sent(db):
+    # A failed statement, unlike a failed flush, leaves the transaction for close() to end
+    db.execute(update(Reminder).values(is_sent=True))
+    db.commit()
+
+def test_close_after_failed_commit_on_other_thread():
+    """A write that fails on one thread and a close() on another must free the writer"""
+    run_migrations()
+    for write in (lambda db: add_reminder(db, "blocked"), mark_all_sent):
+        blocker = sqlite3.connect(DB_PATH, timeout=0)
+        blocker.execute("BEGIN IMMEDIATE")  # Another process holding SQLite's write lock
+        db = SessionLocal()
+        try:
+            in_thread(lambda: write(db))
+            raise AssertionError("write should fail while another connection holds the write lock")
+        except OperationalError as e:
+            assert "locked" in str(e), e
+        finally:
+            in_thread(db.close)
+            blocker.rollback()
+            blocker.close()
+
+    # The writer must be free again for sessions on any thread
+    for n in range(3):
+        writer = SessionLocal()
+        try:
+            in_thread(lambda: add_reminder(writer, f"after-{n}"))
+        finally:
+            writer.close()
+
+    db = SessionLocal()
+    try:
+        titles = [title for (title,) in db.query(Reminder.title).all()]
+    finally:
+        db.close()
+    assert titles == ["after-0", "after-1", "after-2"], titles
+    print("Test completed successfully!")
+
+if __name__ == "__main__":
+    test_close_after_failed_commit_on_other_thread()